@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import random
+import getopt
+import platform
+import tempfile
+import tracemalloc
+import new
+import read_fasta
+import orf
+import repeats
+import seq_lengths
+import gc_content
+import revcomp
+
+
+def usage():
+    print(
+        """Benchmarks of the FASTA parsing and analysis functions of this repository on synthetic FASTA files.
+The files are generated from a seed, so two runs with the same scale and seed time the very same input.
+Every benchmark reports the best time of <repeat> runs, the throughput in bases per second and the peak memory
+allocated while it runs (tracemalloc). The results can be saved as JSON and compared to a previous run to catch
+performance regressions.
+
+Usage:
+    benchmark.py [-h] [-s <scale>] [-r <repeat>] [-k <names>] [-o <output.json>] [-b <baseline.json>] [-t <ratio>]
+
+    -h                  means print this message
+    -s <scale>          one of %s (default = small)
+    -r <repeat>         runs of every benchmark, the best one is kept (default = 3)
+    -k <names>          comma separated benchmark names to run (default = all)
+    -o <output.json>    save the results
+    -b <baseline.json>  compare the results with a saved run
+    -t <ratio>          report a regression when slower than the baseline by more than <ratio> (default = 1.2)
+""" % ", ".join(SCALES))
+
+
+# records count, record length
+SCALES = {
+    "tiny": (20, 1000),
+    "small": (200, 5000),
+    "medium": (1000, 20000),
+    "large": (100, 1000000),
+}
+SEED = 2020
+
+
+def synthetic_fasta(path, records, record_length, seed=SEED, line_width=70):
+    """Writes a FASTA file of random ACGT records, with a short run of N in every record,
+    and returns the number of bases written"""
+    rng = random.Random(seed)
+    with open(path, "w") as out:
+        for i in range(records):
+            seq = new.create_long_dna(record_length, rng=rng)
+            n_start = rng.randrange(record_length)
+            seq = seq[:n_start] + "N" * min(10, record_length - n_start) + seq[n_start + 10:]
+            out.write(">synthetic_%d seed=%d\n" % (i, seed))
+            for j in range(0, record_length, line_width):
+                out.write(seq[j:j + line_width] + "\n")
+    return records * record_length
+
+
+def each_record(f, function):
+    for _, _, seq in read_fasta.iter_records(f):
+        function(seq)
+
+
+BENCHMARKS = {
+    "read_fasta.read": lambda f: read_fasta.read(f),
+    "read_fasta.iter_records": lambda f: sum(1 for _ in read_fasta.iter_records(f)),
+    "read_fasta.iter_records_mmap": lambda f: sum(len(seq) for _, _, seq in read_fasta.iter_records_mmap(f)),
+    "orf.records_with_longest_orfs": lambda f: orf.records_with_longest_orfs(f),
+    "orf.records_with_longest_orfs_at_pos": lambda f: orf.records_with_longest_orfs_at_pos(f, 2),
+    "orf.find_orfs": lambda f: each_record(f, lambda seq: sum(1 for _ in orf.find_orfs(seq))),
+    "orf.find_orfs_numpy": lambda f: each_record(f, lambda seq: sum(1 for _ in orf.find_orfs(seq, backend="numpy"))),
+    "repeats.all_repeats_in_all_seqs": lambda f: repeats.all_repeats_in_all_seqs(12, f),
+    "seq_lengths.stream_lengths": lambda f: seq_lengths.stream_lengths(f),
+    "seq_lengths.sequence_stats": lambda f: seq_lengths.sequence_stats(f),
+    "new.gc": lambda f: each_record(f, new.gc),
+    "gc_content.records_gc": lambda f: list(gc_content.records_gc(f)),
+    "gc_content.gc_windows": lambda f: each_record(f, lambda seq: gc_content.gc_windows(seq, 1000, 100)),
+    "revcomp.reverse_complement": lambda f: each_record(f, revcomp.reverse_complement),
+    "new.count1": lambda f: each_record(f, lambda seq: new.count1(seq, "T")),
+    "new.count4": lambda f: each_record(f, lambda seq: new.count4(seq, "T")),
+}
+
+
+def measure(function, f, bases, repeat=3):
+    """Returns dict(seconds, bases_per_second, peak_bytes) of function(f):
+    the best time of repeat runs without tracing, then one traced run for the peak memory"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        function(f)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function(f)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "bases_per_second": bases / best if best else None, "peak_bytes": peak}
+
+
+def run(scale="small", seed=SEED, repeat=3, names=None):
+    """Times the benchmarks with the record cache off, unless FASTA_NO_CACHE is already set, so the parsing and
+    analysis code is timed and not the cache. The environment is restored afterwards"""
+    no_cache = os.environ.get("FASTA_NO_CACHE")
+    os.environ.setdefault("FASTA_NO_CACHE", "1")
+    try:
+        return run_benchmarks(scale, seed, repeat, names)
+    finally:
+        if no_cache is None:
+            del os.environ["FASTA_NO_CACHE"]
+
+
+def run_benchmarks(scale, seed, repeat, names):
+    records, record_length = SCALES[scale]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        f = os.path.join(directory, "synthetic_%s_%d.fa" % (scale, seed))
+        bases = synthetic_fasta(f, records, record_length, seed)
+        for name, function in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            results[name] = measure(function, f, bases, repeat)
+            sys.stderr.write("%-40s %10.4f s %14.0f bases/s %12d bytes peak\n"
+                             % (name, results[name]["seconds"], results[name]["bases_per_second"] or 0,
+                                results[name]["peak_bytes"]))
+    return {
+        "scale": scale,
+        "seed": seed,
+        "records": records,
+        "record_length": record_length,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(run_results, baseline, max_ratio=1.2):
+    """Returns a list of (name, baseline seconds, seconds, ratio) for the benchmarks slower than the baseline
+    by more than max_ratio. Only runs of the same scale and seed are comparable"""
+    if (run_results["scale"], run_results["seed"]) != (baseline["scale"], baseline["seed"]):
+        raise ValueError("The baseline was run on scale %s seed %s" % (baseline["scale"], baseline["seed"]))
+    regressions = []
+    for name, result in run_results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["seconds"]
+        ratio = result["seconds"] / before if before else float("inf")
+        if ratio > max_ratio:
+            regressions.append((name, before, result["seconds"], ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hs:r:k:o:b:t:')
+    options = dict(optional_args)
+
+    if '-h' in options:
+        usage()
+        sys.exit()
+
+    scale = options.get('-s', 'small')
+    if scale not in SCALES:
+        usage()
+        sys.exit("Unknown scale " + scale)
+    names = options['-k'].split(",") if '-k' in options else None
+
+    run_results = run(scale, repeat=int(options.get('-r', 3)), names=names)
+
+    if '-o' in options:
+        with open(options['-o'], "w") as out:
+            json.dump(run_results, out, indent=2)
+
+    if '-b' in options:
+        with open(options['-b']) as file:
+            baseline = json.load(file)
+        regressions = compare(run_results, baseline, float(options.get('-t', 1.2)))
+        for name, before, after, ratio in regressions:
+            print("Regression: %s %.4f s -> %.4f s (x%.2f)" % (name, before, after, ratio))
+        if regressions:
+            sys.exit(1)
+        print("No regression against", options['-b'])
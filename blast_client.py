@@ -0,0 +1,208 @@
+import io
+import os
+import sys
+import time
+import pickle
+import getopt
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from Bio.Blast import NCBIXML
+import record_cache
+
+
+def usage():
+    print(
+        """BLAST all the records of a FASTA file against NCBI (or any server speaking the qblast Put/Get protocol).
+The queries are packed in batched submissions, several submissions run at once under a rate limit, the XML results
+are parsed incrementally with NCBIXML.parse and every query result is cached on disk, so a query already searched
+with the same program and database is not sent again.
+
+Usage:
+    blast_client.py [-h] [-p <program>] [-d <database>] [-w <workers>] [-b <batch>] [-e <e value>] <filename>
+
+    -h                  means print this message
+    -p <program>        BLAST program (default = blastn)
+    -d <database>       database (default = nt)
+    -w <workers>        submissions running at the same time (default = 3)
+    -b <batch>          queries per submission (default = 10)
+    -e <e value>        only print the alignments with an e value below <e value> (default = 0.01)
+    <filename>          FASTA file of the queries
+
+Environment:
+    BLAST_CACHE_DIR     cache directory (default = ~/.cache/blast_results)
+""")
+
+
+NCBI_BLAST_URL = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
+
+
+def cache_dir():
+    return os.environ.get("BLAST_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "blast_results"))
+
+
+class BlastClient:
+    def __init__(self, program="blastn", database="nt", url_base=NCBI_BLAST_URL, workers=3, batch_size=10,
+                 max_batch_bases=100000, min_interval=10.0, poll_interval=60.0, cache=True):
+        """min_interval is the minimum time in seconds between two requests to the server (NCBI asks for 10),
+        poll_interval the time between two checks of a running submission (NCBI asks for 60)"""
+        self.program = program
+        self.database = database
+        self.url_base = url_base
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_batch_bases = max_batch_bases
+        self.min_interval = min_interval
+        self.poll_interval = poll_interval
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._previous = 0.0
+
+    # rate limited HTTP
+
+    def _request(self, parameters):
+        """POSTs the parameters to the server, never sooner than min_interval after the previous request"""
+        with self._lock:
+            wait = self._previous + self.min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._previous = time.time()
+        message = urlencode(parameters).encode()
+        return urlopen(Request(self.url_base, message, {"User-Agent": "python-4-genomic-data-science"}))
+
+    def submit(self, fasta_str):
+        """Sends one submission, returns its request id"""
+        page = self._request({"CMD": "Put", "PROGRAM": self.program, "DATABASE": self.database,
+                              "QUERY": fasta_str}).read().decode()
+        i = page.find("RID =")
+        if i == -1:
+            raise ValueError("No request id in the answer of %s" % self.url_base)
+        return page[i + len("RID ="):page.find("\n", i)].strip()
+
+    def results(self, rid):
+        """Waits for the submission and returns the handle of its XML results, ready for NCBIXML.parse"""
+        while True:
+            handle = self._request({"CMD": "Get", "RID": rid, "FORMAT_TYPE": "XML"})
+            start = handle.peek(512)[:512]
+            if start.lstrip().startswith(b"<?xml"):
+                return handle
+            page = handle.read()
+            if b"Status=FAILED" in page or b"Status=UNKNOWN" in page:
+                raise ValueError("BLAST request %s failed" % rid)
+            time.sleep(self.poll_interval)
+
+    # cache
+
+    def cache_path(self, seq):
+        key = hashlib.sha256(("%s\0%s\0%s" % (self.program, self.database, seq.upper())).encode()).hexdigest()
+        return os.path.join(cache_dir(), key + ".pickle")
+
+    def cached(self, seq):
+        try:
+            with open(self.cache_path(seq), "rb") as file:
+                return pickle.load(file)
+        except Exception:
+            # missing, truncated, or pickled by another version of Biopython (AttributeError, ModuleNotFoundError):
+            # searched again
+            return None
+
+    def store(self, seq, blast_record):
+        """Caches the result of a query. A cache that can't be written (not a directory, full disk, no permission)
+        is only a cache miss for the next search, the results already fetched are kept"""
+        try:
+            directory = cache_dir()
+            os.makedirs(directory, exist_ok=True)
+            # a temporary file of its own, so threads storing the same sequence don't replace each other's
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as out:
+                pickle.dump(blast_record, out)
+            os.replace(tmp_path, self.cache_path(seq))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    # batches
+
+    def batches(self, queries):
+        """Packs the (identifier, sequence) queries in batches of at most batch_size queries and max_batch_bases"""
+        batch, bases = [], 0
+        for query in queries:
+            if batch and (len(batch) == self.batch_size or bases + len(query[1]) > self.max_batch_bases):
+                yield batch
+                batch, bases = [], 0
+            batch.append(query)
+            bases += len(query[1])
+        if batch:
+            yield batch
+
+    def search_batch(self, batch):
+        """Runs one submission and returns its Blast records in the order of the queries"""
+        fasta_str = "".join(">%s\n%s\n" % (identifier, seq) for identifier, seq in batch)
+        handle = self.results(self.submit(fasta_str))
+        with handle:
+            blast_records = list(NCBIXML.parse(io.TextIOWrapper(handle, encoding="utf-8")))
+        if len(blast_records) != len(batch):
+            raise ValueError("Got %d results for %d queries" % (len(blast_records), len(batch)))
+        if self.cache:
+            for (_, seq), blast_record in zip(batch, blast_records):
+                self.store(seq, blast_record)
+        return blast_records
+
+    def search(self, queries):
+        """BLASTs the (identifier, sequence) queries, returns dict of identifier: Blast record in the queries order"""
+        queries = list(queries)
+        found = {}
+        missing = {}  # sequence, uppercase like the cache key: the (identifier, sequence) query sent for it
+        waiting = []  # (identifier, sequence) of the queries not cached, a sequence repeated is only sent once
+        for identifier, seq in queries:
+            blast_record = self.cached(seq) if self.cache else None
+            if blast_record is None:
+                missing.setdefault(seq.upper(), (identifier, seq))
+                waiting.append((identifier, seq.upper()))
+            else:
+                found[identifier] = blast_record
+        searched = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            batches = list(self.batches(missing.values()))
+            for batch, blast_records in zip(batches, pool.map(self.search_batch, batches)):
+                for (_, seq), blast_record in zip(batch, blast_records):
+                    searched[seq.upper()] = blast_record
+        for identifier, seq in waiting:
+            found[identifier] = searched[seq]
+        return {identifier: found[identifier] for identifier, _ in queries}
+
+    def search_file(self, f):
+        return self.search((identifier, seq) for identifier, _, seq in record_cache.iter_records(f))
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hp:d:w:b:e:')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+
+    client = BlastClient(options.get('-p', 'blastn'), options.get('-d', 'nt'),
+                         workers=int(options.get('-w', 3)), batch_size=int(options.get('-b', 10)))
+    E_value_threshold = float(options.get('-e', 0.01))
+    for query_id, blast_record in client.search_file(required_args[0]).items():
+        for alignment in blast_record.alignments:
+            for hsp in alignment.hsps:  # hsp -> High scoring pairs
+                if hsp.expect < E_value_threshold:
+                    print('*** Alignment ***')
+                    print('query:', query_id)
+                    print('sequence:', alignment.title)
+                    print('length:', alignment.length)
+                    print('e value:', hsp.expect)
+                    print(hsp.query)
+                    print(hsp.match)
+                    print(hsp.sbjct)
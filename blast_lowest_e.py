@@ -1,10 +1,9 @@
-from Bio.Blast import NCBIWWW, NCBIXML
+from blast_client import BlastClient
 
-fasta_str = open("lowest_e_val.fa").read()
-result_handle = NCBIWWW.qblast("blastn", "nt", fasta_str)  # query blast
+client = BlastClient("blastn", "nt")  # query blast, results are cached on disk
 # program: 'blastn' searches nucleotides against nucleotides
 # database: 'nt'
-blast_record = NCBIXML.read(result_handle)
+blast_record = next(iter(client.search_file("lowest_e_val.fa").values()))
 
 lowest_e_value = 9999
 lowest_e_val_alignment = None
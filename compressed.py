@@ -0,0 +1,250 @@
+import io
+import os
+import sys
+import gzip
+import zlib
+import struct
+import getopt
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+"""Transparent reading of gzip and BGZF compressed FASTA files (.fa.gz, .fa.bgz), recognized by their first bytes
+whatever their name, so the scripts of this repository take them like plain FASTA files.
+A gzip file is one deflate stream and is decompressed by the gzip module as it is read.
+BGZF (the blocked gzip of samtools, bgzip and htslib) is a series of independent gzip members of at most 64 KB
+of data each, with the size of the member in the gzip header, so the blocks are found without inflating anything
+and are inflated by a pool of threads (zlib releases the GIL) while the caller parses the previous ones, in order.
+
+Environment:
+    FASTA_DECOMPRESS_THREADS    threads inflating BGZF blocks (default = number of CPUs, at most 8)
+"""
+
+
+def usage():
+    print(
+        """Tells how a FASTA file is compressed, prints it decompressed, or compresses it in BGZF.
+
+Usage:
+    compressed.py [-h] [-c] [-b <output>] <filename>
+
+    -h                  means print this message
+    -c                  write the decompressed file to stdout
+    -b <output>         compress the file in BGZF to <output>, like bgzip
+    <filename>          FASTA file name, plain, gzip or BGZF
+""")
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_HEADER = struct.Struct("<4BI2BH")  # ID1, ID2, CM, FLG, MTIME, XFL, OS, XLEN
+SUBFIELD = struct.Struct("<2sH")  # SI1 SI2, SLEN
+FEXTRA = 4
+BGZF_MAX_DATA = 65280  # uncompressed bytes per block written, as bgzip does
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+CHUNK_SIZE = 1024 * 1024
+BLOCKS_PER_TASK = 16
+
+
+def decompress_threads():
+    return int(os.environ.get("FASTA_DECOMPRESS_THREADS", min(os.cpu_count() or 1, 8)))
+
+
+def bgzf_block_size(header):
+    """Size of the whole BGZF block starting with header (its first bytes), None if header is not a BGZF block"""
+    if len(header) < GZIP_HEADER.size or not header.startswith(GZIP_MAGIC):
+        return None
+    _, _, method, flags, _, _, _, extra_length = GZIP_HEADER.unpack_from(header)
+    if method != 8 or not flags & FEXTRA:
+        return None
+    pos = GZIP_HEADER.size
+    end = pos + extra_length
+    while pos + SUBFIELD.size <= min(end, len(header)):
+        name, length = SUBFIELD.unpack_from(header, pos)
+        if name == b"BC" and length == 2 and pos + SUBFIELD.size + 2 <= len(header):
+            return struct.unpack_from("<H", header, pos + SUBFIELD.size)[0] + 1
+        pos += SUBFIELD.size + length
+    return None
+
+
+def compression(f):
+    """'bgzf', 'gzip' or None for a plain file, from the first bytes of the file"""
+    with open(f, "rb") as file:
+        header = file.read(64)
+    if not header.startswith(GZIP_MAGIC):
+        return None
+    return "bgzf" if bgzf_block_size(header) is not None else "gzip"
+
+
+def decompressed_size(f):
+    """Size of the content of a plain, gzip or BGZF file once decompressed, read from the gzip trailers without
+    inflating anything: the sum of the sizes of the blocks of a BGZF file, the size in the trailer of a gzip file.
+    That one is modulo 2 ** 32 and only counts the last member, so it is an estimate, never taken below the size
+    of the compressed file"""
+    kind = compression(f)
+    size = os.path.getsize(f)
+    if kind is None:
+        return size
+    with open(f, "rb") as file:
+        if kind == "gzip":
+            file.seek(-4, os.SEEK_END)
+            estimate = struct.unpack("<I", file.read(4))[0]
+            while estimate < size:
+                estimate += 2 ** 32
+            return estimate
+        total = 0
+        while True:
+            header = file.read(GZIP_HEADER.size)
+            if not header:
+                return total
+            header += file.read(GZIP_HEADER.unpack_from(header)[-1] if len(header) == GZIP_HEADER.size else 0)
+            block_size = bgzf_block_size(header)
+            if block_size is None:
+                raise ValueError("Not a BGZF block at byte %d of %s" % (file.tell() - len(header), f))
+            file.seek(block_size - len(header) - 4, os.SEEK_CUR)
+            trailer = file.read(4)
+            if len(trailer) < 4:
+                raise ValueError("Truncated BGZF block at the end of %s" % f)
+            total += struct.unpack("<I", trailer)[0]
+
+
+def iter_bgzf_blocks(file):
+    """Yields the BGZF blocks of the open binary file, still compressed"""
+    while True:
+        header = file.read(GZIP_HEADER.size)
+        if not header:
+            return
+        extra_length = GZIP_HEADER.unpack_from(header)[-1] if len(header) == GZIP_HEADER.size else 0
+        header += file.read(extra_length)
+        size = bgzf_block_size(header)
+        if size is None:
+            raise ValueError("Not a BGZF block at byte %d of %s" % (file.tell() - len(header), file.name))
+        block = header + file.read(size - len(header))
+        if len(block) < size:
+            raise ValueError("Truncated BGZF block at the end of %s" % file.name)
+        yield block
+
+
+def inflate_blocks(blocks):
+    """Work done by one pool task: the data of the BGZF blocks, checked against their CRC and size"""
+    data = []
+    for block in blocks:
+        extra_length = GZIP_HEADER.unpack_from(block)[-1]
+        inflated = zlib.decompress(block[GZIP_HEADER.size + extra_length:-8], -15)
+        crc, size = struct.unpack_from("<II", block, len(block) - 8)
+        if size != len(inflated) or crc != zlib.crc32(inflated):
+            raise ValueError("Corrupted BGZF block")
+        data.append(inflated)
+    return b"".join(data)
+
+
+def iter_bgzf(f, threads=None):
+    """Yields the decompressed data of a BGZF file as bytes chunks, in order,
+    the blocks being inflated BLOCKS_PER_TASK at a time by a pool of threads"""
+    threads = threads or decompress_threads()
+    with open(f, "rb") as file, ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        blocks = []
+        for block in iter_bgzf_blocks(file):
+            blocks.append(block)
+            if len(blocks) == BLOCKS_PER_TASK:
+                pending.append(pool.submit(inflate_blocks, blocks))
+                blocks = []
+                if len(pending) > 2 * threads:
+                    yield pending.popleft().result()
+        if blocks:
+            pending.append(pool.submit(inflate_blocks, blocks))
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_chunks(f, chunk_size=CHUNK_SIZE, threads=None):
+    """Yields the content of a plain, gzip or BGZF file as bytes chunks, decompressed"""
+    kind = compression(f)
+    if kind == "bgzf":
+        yield from iter_bgzf(f, threads)
+        return
+    with (gzip.open(f, "rb") if kind == "gzip" else open(f, "rb")) as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only binary stream over an iterator of bytes chunks"""
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+        super().close()
+
+
+def open_fasta(f, mode="r", threads=None):
+    """Opens a plain, gzip or BGZF file for reading, in text mode ("r") or binary mode ("rb")"""
+    kind = compression(f)
+    if kind is None:
+        return open(f, mode)
+    if kind == "gzip":
+        return gzip.open(f, "rt" if mode == "r" else mode)
+    stream = io.BufferedReader(ChunkReader(iter_bgzf(f, threads)), CHUNK_SIZE)
+    return io.TextIOWrapper(stream) if mode == "r" else stream
+
+
+def read_bytes(f, threads=None):
+    """The whole content of a plain, gzip or BGZF file, decompressed"""
+    return b"".join(iter_chunks(f, threads=threads))
+
+
+def write_bgzf(f, out_path):
+    """Compresses the file f in BGZF to out_path. Returns the number of blocks written, EOF block excluded"""
+    blocks = 0
+    with open(f, "rb") as file, open(out_path, "wb") as out:
+        while True:
+            data = file.read(BGZF_MAX_DATA)
+            if not data:
+                break
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compressor.compress(data) + compressor.flush()
+            size = GZIP_HEADER.size + SUBFIELD.size + 2 + len(deflated) + 8
+            out.write(GZIP_HEADER.pack(0x1f, 0x8b, 8, FEXTRA, 0, 0, 0xff, SUBFIELD.size + 2))
+            out.write(SUBFIELD.pack(b"BC", 2) + struct.pack("<H", size - 1))
+            out.write(deflated + struct.pack("<II", zlib.crc32(data), len(data)))
+            blocks += 1
+        out.write(BGZF_EOF)
+    return blocks
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hcb:')
+    options = dict(optional_args)
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+    try:
+        kind = compression(required_args[0])
+    except IOError:
+        sys.exit("Error opening file")
+    if '-b' in options:
+        print(write_bgzf(required_args[0], options['-b']), "BGZF blocks written to", options['-b'])
+    elif '-c' in options:
+        for chunk in iter_chunks(required_args[0]):
+            sys.stdout.buffer.write(chunk)
+    else:
+        print(required_args[0], "is", kind or "not compressed")
@@ -1,6 +1,11 @@
 
 import read_fasta
+import record_cache
+import compressed
+import os
 import sys
+import getopt
+from concurrent.futures import ProcessPoolExecutor
 
 """(1) How many records are in the file? A record in a FASTA file is defined as a single-line header,
 followed by lines of sequence data. The header line is distinguished from the sequence data by a greater-than (">") symbol in the first column.
@@ -8,9 +13,73 @@ The word following the ">" symbol is the identifier of the sequence, and the res
 There should be no space between the ">" and the first letter of the identifier. """
 
 
-def count_fasta_records(f):
-    records = read_fasta.read(f)
-    return len(records)
-    
+def count_fasta_records(f, mapped=False):
+    """With mapped=True the file is memory mapped and the records are walked without copying any line"""
+    records = read_fasta.iter_records_mmap(f) if mapped else record_cache.iter_records(f)
+    return sum(1 for _ in records)
+
+
+BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def count_headers_in_range(f, start, end, block_size=BLOCK_SIZE):
+    """Counts the '>' at the start of a line between the bytes start and end of the file.
+    Every block is read with the byte before it, so a newline-'>' pair split by a block boundary is still seen,
+    and each pair is counted by the block holding its '>'."""
+    count = 0
+    with open(f, "rb") as file:
+        if start == 0:
+            count += file.read(1) == b">"
+        pos = start
+        while pos < end:
+            read_from = max(pos - 1, 0)
+            file.seek(read_from)
+            block = file.read(min(block_size, end - pos) + pos - read_from)
+            if len(block) <= pos - read_from:
+                break  # end of file
+            count += block.count(b"\n>")
+            pos = read_from + len(block)
+    return count
+
+
+def count_headers_in_chunks(chunks):
+    """Counts the '>' at the start of a line in a stream of bytes chunks, the decompressed content of a file"""
+    count = 0
+    previous = b"\n"
+    for chunk in chunks:
+        if not chunk:
+            continue
+        count += (previous + chunk[:1]).count(b"\n>") + chunk.count(b"\n>")
+        previous = chunk[-1:]
+    return count
+
+
+def count_headers(f, workers=1, block_size=BLOCK_SIZE):
+    """How many records are in the file, counted on the header lines only: no sequence is assembled and
+    records with the same identifier are all counted. With workers > 1 the file is split in byte ranges
+    counted by a pool of processes. A gzip or BGZF compressed file is counted while it is decompressed."""
+    try:
+        size = os.path.getsize(f)
+        kind = compressed.compression(f)
+    except OSError:
+        sys.exit("Error opening file")
+    if kind is not None:
+        return count_headers_in_chunks(compressed.iter_chunks(f))
+    if workers <= 1 or size < 2 * block_size:
+        return count_headers_in_range(f, 0, size, block_size)
+    step = -(-size // workers)
+    starts = range(0, size, step)
+    ends = [min(start + step, size) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(count_headers_in_range, [f] * len(ends), starts, ends, [block_size] * len(ends)))
+
+
 if __name__ == "__main__":
-    sys.stdout.write("Records count: %s\n"  %count_fasta_records(sys.argv[1]))
+    # -m memory maps the file, -f counts the header lines only, -w <workers> splits that count over processes
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'mfw:')
+    options = dict(optional_args)
+    if '-f' in options or '-w' in options:
+        count = count_headers(required_args[0], workers=int(options.get('-w', 1)))
+    else:
+        count = count_fasta_records(required_args[0], mapped='-m' in options)
+    sys.stdout.write("Records count: %s\n" % count)
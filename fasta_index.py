@@ -0,0 +1,147 @@
+import sys
+import os
+import tempfile
+import compressed
+
+"""Random access to the records of a FASTA file by identifier.
+The index is a sidecar file next to the FASTA file (<filename>.fai) using the same layout as samtools faidx:
+one tab separated line per record with
+
+    identifier, sequence length, byte offset of the first base, bases per line, bytes per line
+
+With the offset and the line geometry any base of a record can be located with one seek,
+so fetching a record (or a part of it) does not need to parse the rest of the file.
+
+Usage:
+    fasta_index.py <filename>                        build the index
+    fasta_index.py <filename> <identifier>           print the sequence of a record
+    fasta_index.py <filename> <identifier> <start> <end>
+                                                     print the bases start..end (0-based, end excluded)
+"""
+
+
+def index_path(f):
+    return f + ".fai"
+
+
+def build_index(f):
+    """Scans the FASTA file once and writes the .fai sidecar file. When it can't be written (read-only directory,
+    full disk) the index is only kept in memory and the file is scanned again next time.
+    Returns a dict of identifier: (length, offset, line_bases, line_width)"""
+    try:
+        file = open(f, "rb")
+    except IOError:
+        sys.exit("Error opening file")
+    if file.read(2) == compressed.GZIP_MAGIC:
+        file.close()
+        raise ValueError("%s is compressed, it can not be indexed" % f)
+    file.seek(0)
+    index = {}
+    seq_name = None
+    length = offset = line_bases = line_width = 0
+    last_line_short = blank_line = False
+    pos = 0
+    with file:
+        for line in file:
+            line_start = pos
+            pos += len(line)
+            if line.startswith(b">"):
+                if seq_name is not None:
+                    index[seq_name] = (length, offset, line_bases, line_width)
+                header = line[1:].split(None, 1)
+                seq_name = header[0].decode() if header else ''
+                length = line_bases = line_width = 0
+                offset = pos
+                last_line_short = blank_line = False
+                continue
+            bases = len(line.rstrip(b"\r\n"))
+            if not bases:
+                blank_line = True
+                continue
+            if blank_line:
+                raise ValueError("Record %s at byte %d has a blank line inside its sequence, it can not be indexed"
+                                 % (seq_name, line_start))
+            # the last line of the file may lack its newline
+            unterminated = not line.endswith(b"\n")
+            if line_bases == 0:
+                line_bases, line_width = bases, len(line)
+            elif (last_line_short or bases > line_bases
+                  or (bases == line_bases and len(line) != line_width and not unterminated)):
+                raise ValueError("Record %s at byte %d has lines of different length, it can not be indexed"
+                                 % (seq_name, line_start))
+            last_line_short = bases < line_bases
+            length += bases
+    if seq_name is not None:
+        index[seq_name] = (length, offset, line_bases, line_width)
+    try:
+        write_index(index, index_path(f))
+    except OSError:
+        pass
+    return index
+
+
+def write_index(index, path):
+    """Writes the index to a temporary file renamed to path, so a failed write never leaves a truncated index"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as out:
+            for seq_name, (length, offset, line_bases, line_width) in index.items():
+                out.write("%s\t%d\t%d\t%d\t%d\n" % (seq_name, length, offset, line_bases, line_width))
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+def read_index(f):
+    """Loads the .fai of a FASTA file, building it first if it is missing or older than the FASTA file.
+    Returns a dict of identifier: (length, offset, line_bases, line_width)"""
+    path = index_path(f)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(f):
+        return build_index(f)
+    index = {}
+    with open(path) as file:
+        for line in file:
+            seq_name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")
+            index[seq_name] = (int(length), int(offset), int(line_bases), int(line_width))
+    return index
+
+
+def fetch(f, identifier, start=0, end=None, index=None):
+    """Returns the bases start..end (0-based, end excluded, like a slice) of the record with the given identifier
+    reading only the bytes that hold them."""
+    if index is None:
+        index = read_index(f)
+    with open(f, "rb") as file:
+        return read_bases(file, index[identifier], start, end).decode()
+
+
+def read_bases(file, entry, start=0, end=None):
+    """Bytes of the bases start..end of the record described by the index entry, read from the open binary file"""
+    length, offset, line_bases, line_width = entry
+    if end is None or end > length:
+        end = length
+    start = max(start, 0)
+    if start >= end:
+        return b''
+    first = offset + (start // line_bases) * line_width + start % line_bases
+    last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases
+    file.seek(first)
+    chunk = file.read(last - first + 1)
+    return chunk.replace(b"\n", b"").replace(b"\r", b"")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("No input FASTA file provided")
+    if len(sys.argv) == 2:
+        built = build_index(sys.argv[1])
+        path = index_path(sys.argv[1])
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(sys.argv[1]):
+            print("Indexed", len(built), "records into", path)
+        else:
+            print("Indexed", len(built), "records, the index could not be written to", path)
+    elif len(sys.argv) == 3:
+        print(fetch(sys.argv[1], sys.argv[2]))
+    else:
+        print(fetch(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])))
@@ -0,0 +1,97 @@
+import sys
+import getopt
+import numpy as np
+import record_cache
+
+
+def usage():
+    print(
+        """GC content of every record of a FASTA file, or a GC track along the records in bedGraph format.
+GC counts G, C and S (strong) case insensitively. The percentage is given over all the bases and over the
+bases that are not N, only the latter is used for the tracks, and windows made of N only are left out.
+
+Usage:
+    gc_content.py [-h] [-w <window> [-s <step>]] [-o <output>] <filename>
+
+    -h                  means print this message
+    -w <window>         GC track over windows of <window> bases instead of one value per record
+    -s <step>           start a window every <step> bases (default = <window>, i.e. tiled windows)
+    -o <output>         write the bedGraph track to <output> instead of the standard output
+    <filename>          FASTA file name
+""")
+
+
+# class of every byte: 0 = A/T (or other base), 1 = G/C/S, 2 = N
+BASE_CLASS = np.zeros(256, dtype=np.uint8)
+for base in "GCSgcs":
+    BASE_CLASS[ord(base)] = 1
+for base in "Nn":
+    BASE_CLASS[ord(base)] = 2
+
+
+def classify(seq):
+    return BASE_CLASS[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def gc(seq):
+    """Returns a tuple (GC percentage, GC percentage of the bases that are not N) of one sequence"""
+    classes = classify(seq)
+    gc_bases = int(np.count_nonzero(classes == 1))
+    defined = len(classes) - int(np.count_nonzero(classes == 2))
+    return (gc_bases * 100 / len(classes) if len(classes) else 0.0,
+            gc_bases * 100 / defined if defined else 0.0)
+
+
+def records_gc(f):
+    """Yields (identifier, length, GC percentage, GC percentage without N) for every record of the file"""
+    for identifier, _, seq in record_cache.iter_records(f):
+        yield (identifier, len(seq)) + gc(seq)
+
+
+def gc_windows(seq, window, step=None):
+    """GC percentage (N excluded) of the windows starting every step bases, the last window may be shorter.
+    Running sums of the GC and non-N bases give any window with two lookups, whatever its size.
+    Returns three arrays: window starts, window ends and GC percentage (NaN for windows with N only)"""
+    step = step or window
+    classes = classify(seq)
+    gc_sum = np.concatenate(([0], np.cumsum(classes == 1, dtype=np.int64)))
+    defined_sum = np.concatenate(([0], np.cumsum(classes != 2, dtype=np.int64)))
+    starts = np.arange(0, len(classes), step, dtype=np.int64)
+    ends = np.minimum(starts + window, len(classes))
+    defined = defined_sum[ends] - defined_sum[starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = (gc_sum[ends] - gc_sum[starts]) * 100 / defined
+    return starts, ends, np.where(defined > 0, percent, np.nan)
+
+
+def write_bedgraph(f, out, window, step=None):
+    """Streams the GC track of all the records to the open file out, one record at a time,
+    as bedGraph lines: identifier, start (0-based), end, GC percentage"""
+    for identifier, _, seq in record_cache.iter_records(f):
+        starts, ends, percent = gc_windows(seq, window, step)
+        keep = ~np.isnan(percent)
+        for start, end, value in zip(starts[keep].tolist(), ends[keep].tolist(), percent[keep].tolist()):
+            out.write("%s\t%d\t%d\t%.3f\n" % (identifier, start, end, value))
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hw:s:o:')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+
+    if '-w' in options:
+        window = int(options['-w'])
+        step = int(options.get('-s', window))
+        if window <= 0 or step <= 0:
+            sys.exit("Positive integer window and step required")
+        if '-o' in options:
+            with open(options['-o'], "w") as out:
+                write_bedgraph(required_args[0], out, window, step)
+        else:
+            write_bedgraph(required_args[0], sys.stdout, window, step)
+    else:
+        for identifier, length, percent, percent_defined in records_gc(required_args[0]):
+            print("%s\t%d\t%5.3f%%\t%5.3f%%" % (identifier, length, percent, percent_defined))
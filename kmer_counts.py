@@ -0,0 +1,220 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import record_cache
+
+"""k-mer counting on 2-bit packed integers instead of string slices.
+Every base is encoded in 2 bits (A=0, C=1, G=2, T=3), so a k-mer is an integer below 4**k which is computed for
+all the windows of a sequence at once with shifts and ors over a NumPy array.
+Up to DENSE_MAX_K the counts go in a dense array indexed by the k-mer code (4**k counters), above that the codes
+of each sequence are counted with np.unique and merged in a dict of int: count.
+count_kmers_sharded spreads the work over processes: the sequences are cut in shards of about SHARD_BASES bases,
+whole records or pieces of a long record overlapping by k - 1 bases, every shard is counted into a sorted table of
+codes and counts and the tables are summed as they come back into the same counts as count_kmers.
+Windows containing a base other than A, C, G or T (N, IUPAC codes, gaps) are not counted, and lowercase
+(soft-masked) bases are counted as their uppercase base."""
+
+DENSE_MAX_K = 13
+SHARD_BASES = 4000000
+MAX_PACKED_K = 31  # 2 * 31 bits still fit in an int64
+
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+UPPERCASE_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for code, base in enumerate("ACGT"):
+    BASE_CODES[ord(base)] = code
+    BASE_CODES[ord(base.lower())] = code
+    UPPERCASE_BASE_CODES[ord(base)] = code
+
+
+def encode(seq, case_sensitive=False):
+    """uint8 array of 2-bit base codes, 4 for the bases that are not ACGT (nor acgt unless case_sensitive)"""
+    table = UPPERCASE_BASE_CODES if case_sensitive else BASE_CODES
+    return table[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def kmer_windows(seq, k, case_sensitive=False):
+    """(codes, valid): int64 array with the code of the k-mer at every position of seq, and bool array telling
+    which of them contain only ACGT (the code of the others is meaningless).
+    With case_sensitive=True the windows with a lowercase base are not valid either"""
+    codes = encode(seq, case_sensitive)
+    n_windows = len(codes) - k + 1
+    if n_windows <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = invalid[k:] - invalid[:n_windows] == 0
+    bases = np.where(codes == 4, 0, codes).astype(np.int64)
+    kmers = np.zeros(n_windows, dtype=np.int64)
+    for j in range(k):
+        kmers <<= 2
+        kmers |= bases[j:j + n_windows]
+    return kmers, valid
+
+
+def kmer_codes(seq, k):
+    """int64 array with the code of every k-mer of seq that contains only ACGT, in the order of the positions"""
+    kmers, valid = kmer_windows(seq, k)
+    return kmers[valid]
+
+
+def decode(code, k):
+    bases = []
+    for _ in range(k):
+        bases.append("ACGT"[code & 3])
+        code >>= 2
+    return "".join(reversed(bases))
+
+
+def count_kmers(seqs, k):
+    """Counts all the k-mers of the sequences.
+    Returns dict of k-mer code: times (only the k-mers that occur)"""
+    if k > MAX_PACKED_K:
+        raise ValueError("k-mers longer than %d bases do not fit a 64 bit code" % MAX_PACKED_K)
+    if k <= DENSE_MAX_K:
+        counts = np.zeros(4 ** k, dtype=np.uint32)
+        # the codes of short records are gathered, a bincount costs 4**k whatever the number of codes
+        pending, pending_size = [], 0
+        for seq in seqs:
+            pending.append(kmer_codes(seq, k))
+            pending_size += len(pending[-1])
+            if pending_size >= max(SHARD_BASES, 4 ** k // 16):
+                np.add(counts, np.bincount(np.concatenate(pending), minlength=4 ** k), out=counts, casting="unsafe")
+                pending, pending_size = [], 0
+        if pending:
+            np.add(counts, np.bincount(np.concatenate(pending), minlength=4 ** k), out=counts, casting="unsafe")
+        present = np.flatnonzero(counts)
+        return dict(zip(present.tolist(), counts[present].tolist()))
+    counts = {}
+    for seq in seqs:
+        codes, times = np.unique(kmer_codes(seq, k), return_counts=True)
+        for code, n in zip(codes.tolist(), times.tolist()):
+            counts[code] = counts.get(code, 0) + n
+    return counts
+
+
+def shards(seqs, k, shard_bases=SHARD_BASES):
+    """Groups the sequences in lists of about shard_bases bases. A sequence longer than that is cut in pieces
+    overlapping by k - 1 bases, so every window of length k is in exactly one piece"""
+    shard, shard_size = [], 0
+    for seq in seqs:
+        for start in range(0, max(1, len(seq) - k + 1), shard_bases):
+            piece = seq[start:start + shard_bases + k - 1]
+            shard.append(piece)
+            shard_size += len(piece)
+            if shard_size >= shard_bases:
+                yield shard
+                shard, shard_size = [], 0
+    if shard:
+        yield shard
+
+
+def count_shard(shard, k):
+    """Work done by one pool task: (codes, times), the sorted distinct k-mer codes of the shard and their counts"""
+    codes = [kmer_codes(seq, k) for seq in shard]
+    return np.unique(np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64), return_counts=True)
+
+
+def map_shards(function, shards, k, workers):
+    """Yields function(shard, k) for every shard, in order, computed by a pool of workers processes.
+    At most 2 * workers shards are sent ahead, so the input is not all copied to the pool at once"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for shard in shards:
+            pending.append(pool.submit(function, shard, k))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def merge_tables(tables):
+    """Sums (codes, times) tables into one (codes, times) table"""
+    codes = np.concatenate([table[0] for table in tables])
+    times = np.concatenate([table[1] for table in tables]).astype(np.int64)
+    if not len(codes):
+        return codes, times
+    order = np.argsort(codes, kind="stable")
+    codes, times = codes[order], times[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    return codes[starts], np.add.reduceat(times, starts)
+
+
+def sum_tables(tables, k):
+    """Sums the (codes, times) tables of k-mers into one (codes, times) table as they arrive, so they are not all
+    held at the same time: in a dense array of 4**k counters up to DENSE_MAX_K, above that the tables waiting are
+    merged into the running sum once they hold as many codes as it, so each code is merged O(log(tables)) times"""
+    if k <= DENSE_MAX_K:
+        counts = np.zeros(4 ** k, dtype=np.uint32)
+        for codes, times in tables:
+            counts[codes] += times.astype(np.uint32)
+        present = np.flatnonzero(counts)
+        return present, counts[present].astype(np.int64)
+    merged = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    waiting, waiting_codes = [], 0
+    for table in tables:
+        waiting.append(table)
+        waiting_codes += len(table[0])
+        if waiting_codes >= len(merged[0]):
+            merged = merge_tables([merged] + waiting)
+            waiting, waiting_codes = [], 0
+    return merge_tables([merged] + waiting)
+
+
+def count_kmers_sharded(seqs, k, workers=1, shard_bases=SHARD_BASES):
+    """Same result as count_kmers, the shards being counted by a pool of workers processes
+    and summed as their tables come back.
+    Returns dict of k-mer code: times (only the k-mers that occur)"""
+    if k > MAX_PACKED_K:
+        raise ValueError("k-mers longer than %d bases do not fit a 64 bit code" % MAX_PACKED_K)
+    if workers <= 1:
+        tables = (count_shard(shard, k) for shard in shards(seqs, k, shard_bases))
+    else:
+        tables = map_shards(count_shard, shards(seqs, k, shard_bases), k, workers)
+    codes, times = sum_tables(tables, k)
+    return dict(zip(codes.tolist(), times.tolist()))
+
+
+def repeats_from_counts(counts, k, min_times=2):
+    """Returns dict of repeat: times for the k-mers occurring at least min_times"""
+    return {decode(code, k): times for code, times in counts.items() if times >= min_times}
+
+
+def count_repeat_shard(shard, k):
+    """Work done by one pool task for all_repeats_in_all_seqs: the (codes, times) table of the k-mers made of
+    uppercase ACGT only, and the dict of k-mer: times of the other windows (N, lowercase...) counted as strings"""
+    codes = []
+    other_kmers = {}
+    for seq in shard:
+        kmers, valid = kmer_windows(seq, k, case_sensitive=True)
+        codes.append(kmers[valid])
+        for i in np.flatnonzero(~valid).tolist():
+            kmer = seq[i:i + k]
+            other_kmers[kmer] = other_kmers.get(kmer, 0) + 1
+    codes, times = np.unique(np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64), return_counts=True)
+    return codes, times, other_kmers
+
+
+def all_repeats_in_all_seqs(N, f, workers=1):
+    """Same repeats and counts as repeats.all_repeats_in_all_seqs, case sensitive like it: the N-mers made of
+    uppercase ACGT are counted as packed codes, the other ones (soft-masked, N...) as strings.
+    The shards are counted by a pool of workers processes when workers > 1 and summed as they come back.
+    The dict is in the order of the codes and not of the first occurrences
+    Returns dict of repeats: times"""
+    if N > MAX_PACKED_K:
+        raise ValueError("k-mers longer than %d bases do not fit a 64 bit code" % MAX_PACKED_K)
+    seqs = (seq for _, _, seq in record_cache.iter_records(f))
+    if workers > 1:
+        shard_counts = map_shards(count_repeat_shard, shards(seqs, N), N, workers)
+    else:
+        shard_counts = (count_repeat_shard(shard, N) for shard in shards(seqs, N))
+    other_repeats = {}
+
+    def packed_tables():
+        for codes, times, other_kmers in shard_counts:
+            for kmer, kmer_times in other_kmers.items():
+                other_repeats[kmer] = other_repeats.get(kmer, 0) + kmer_times
+            yield codes, times
+
+    codes, times = sum_tables(packed_tables(), N)
+    repeated = times >= 2
+    found = repeats_from_counts(dict(zip(codes[repeated].tolist(), times[repeated].tolist())), N)
+    found.update((kmer, times) for kmer, times in other_repeats.items() if times >= 2)
+    return found
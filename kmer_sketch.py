@@ -0,0 +1,265 @@
+import sys
+import math
+import heapq
+import getopt
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import record_cache
+import kmer_counts
+
+"""Approximate most frequent repeats in fixed memory, for a quick look at huge read sets.
+The k-mers (the 2-bit packed codes of kmer_counts, so k up to 31, ACGT windows only, lowercase counted as uppercase)
+go through two summaries whose sizes are set by the user and don't grow with the input:
+- a count-min sketch of depth rows of width counters. Its estimate of a k-mer never undercounts and, with
+  probability 1 - exp(-depth), overcounts by at most e / width times the number of k-mers seen
+- a Space-Saving summary of capacity k-mers, the candidates for the most frequent ones. Every k-mer occurring more
+  than total / capacity times is in it, with a count that overcounts by at most the error recorded with it
+Every heavy hitter is reported with its estimate, the smallest of the two counts, which is an upper bound of its
+true count, and a lower bound, the Space-Saving count minus its error.
+Summaries built on separate shards with the same width, depth, capacity and seed are merged into the summary of the
+whole input."""
+
+
+def usage():
+    print(
+        """Approximate most frequent repeats of length N, with bounds of their true count, in fixed memory.
+Several FASTA files are summarized in parallel (one process each) and their summaries are merged.
+
+Usage:
+    kmer_sketch.py [-h] [-n <N>] [-k <top>] [-W <width>] [-d <depth>] [-c <capacity>] [-w <workers>] <filename>...
+
+    -h                  means print this message
+    -n <N>              repeat length (default = 12)
+    -k <top>            print the <top> heaviest k-mers instead of the most frequent ones only
+    -W <width>          counters per row of the count-min sketch (default = 2 ** 20)
+    -d <depth>          rows of the count-min sketch (default = 4)
+    -c <capacity>       k-mers kept by the Space-Saving summary (default = 1000)
+    -w <workers>        files summarized at the same time (default = 1)
+    <filename>          FASTA file names
+
+Output: repeat, estimate (upper bound of its count), lower bound of its count
+""")
+
+
+WIDTH = 2 ** 20
+DEPTH = 4
+CAPACITY = 1000
+SEED = 1
+CHUNK_BASES = 1000000
+
+
+class CountMinSketch:
+    def __init__(self, width=WIDTH, depth=DEPTH, seed=SEED):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        # one odd 64 bit multiplier per row, the same for every sketch made with the same seed
+        self.multipliers = np.random.default_rng(seed).integers(1, 2 ** 63, depth, dtype=np.uint64) * 2 + 1
+        self.table = np.zeros((depth, width), dtype=np.uint64)
+        self.total = 0
+
+    def columns(self, codes):
+        hashes = codes.astype(np.uint64)[None, :] * self.multipliers[:, None]
+        return ((hashes >> np.uint64(32)) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, codes, times):
+        """Adds times occurrences of every code (codes don't repeat)"""
+        for row, columns in enumerate(self.columns(codes)):
+            self.table[row] += np.bincount(columns, weights=times, minlength=self.width).astype(np.uint64)
+        self.total += int(times.sum())
+
+    def estimate(self, codes):
+        """Count of every code, never lower than the true count"""
+        return self.table[np.arange(self.depth)[:, None], self.columns(codes)].min(axis=0)
+
+    def error_bound(self):
+        """(overcount, probability): the overcount of an estimate is below the bound with that probability"""
+        return math.ceil(math.e / self.width * self.total), 1 - math.exp(-self.depth)
+
+    def merge(self, other):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Only sketches with the same width, depth and seed can be merged")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """Weighted Space-Saving: when the summary is full a new k-mer takes the place of the one with the smallest
+    count, and starts from that count which it records as its error"""
+    def __init__(self, capacity=CAPACITY):
+        if capacity < 1:
+            raise ValueError("A Space-Saving summary keeps at least 1 k-mer")
+        self.capacity = capacity
+        self.counters = {}  # code: [count, error]
+        self.heap = []  # (count, code), stale entries are skipped when looking for the minimum
+
+    def minimum(self):
+        heap, counters = self.heap, self.counters
+        while heap[0][1] not in counters or counters[heap[0][1]][0] != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def add(self, codes, times, estimates=None):
+        """Adds times occurrences of every code (codes don't repeat).
+        estimates are the counts of the codes in a count-min sketch that already holds these occurrences, never
+        below their true counts so far. A code not in the summary whose estimate is not above the floor can't be
+        more frequent than the k-mers kept, so it is skipped: only the codes kept and the candidates above the
+        floor, largest estimate first, go through the loop"""
+        if estimates is not None and len(codes):
+            kept = np.isin(codes, np.fromiter(self.counters, dtype=np.int64, count=len(self.counters)))
+            self.add(codes[kept], times[kept])
+            candidates = np.flatnonzero(~kept & (estimates > self.floor()))
+            candidates = candidates[np.argsort(-estimates[candidates], kind="stable")]
+            codes, times, estimates = codes[candidates], times[candidates], estimates[candidates].tolist()
+        counters = self.counters
+        for i, (code, n) in enumerate(zip(codes.tolist(), times.tolist())):
+            counter = counters.get(code)
+            if counter is not None:
+                counter[0] += n
+            elif len(counters) < self.capacity:
+                counter = counters[code] = [n, 0]
+            else:
+                smallest, evicted = self.minimum()
+                if estimates is not None and estimates[i] <= smallest:
+                    # the candidates left have no larger estimate and the floor never goes down
+                    break
+                del counters[evicted]
+                counter = counters[code] = [smallest + n, smallest]
+            heapq.heappush(self.heap, (counter[0], code))
+            # the stale entries are dropped as soon as they outnumber the live ones, so the heap stays O(capacity)
+            # however many codes a single call adds
+            if len(self.heap) > 4 * self.capacity:
+                self.heap = [(count, code) for code, (count, _) in counters.items()]
+                heapq.heapify(self.heap)
+
+    def floor(self):
+        """Count given to a k-mer not in the summary: 0 until the summary is full, then the smallest count"""
+        return self.minimum()[0] if len(self.counters) == self.capacity else 0
+
+    def merge(self, other):
+        """Mergeable summaries: a k-mer missing from one side is counted as that side's floor,
+        then the capacity largest counts are kept"""
+        floor, other_floor = self.floor(), other.floor()
+        merged = {}
+        for code in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(code, (floor, floor))
+            other_count, other_error = other.counters.get(code, (other_floor, other_floor))
+            merged[code] = [count + other_count, error + other_error]
+        kept = heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0])
+        self.counters = dict(kept)
+        self.heap = [(count, code) for code, (count, _) in kept]
+        heapq.heapify(self.heap)
+        return self
+
+
+class HeavyHitters:
+    """The count-min sketch and the Space-Saving summary of the k-mers of length k of a stream of sequences"""
+    def __init__(self, k, width=WIDTH, depth=DEPTH, capacity=CAPACITY, seed=SEED):
+        if k > kmer_counts.MAX_PACKED_K:
+            raise ValueError("k-mers longer than %d bases do not fit a 64 bit code" % kmer_counts.MAX_PACKED_K)
+        self.k = k
+        self.sketch = CountMinSketch(width, depth, seed)
+        self.summary = SpaceSaving(capacity)
+        self.pending = []  # k-mer codes of the records added since the last flush
+        self.pending_size = 0
+
+    def add(self, seq):
+        """The k-mers of short records are gathered until they make a chunk of about CHUNK_BASES, so the summaries
+        are updated once per chunk and not once per record"""
+        # long records go in chunks overlapping by k - 1 bases, so the memory used doesn't depend on them
+        for start in range(0, max(1, len(seq) - self.k + 1), CHUNK_BASES):
+            codes = kmer_counts.kmer_codes(seq[start:start + CHUNK_BASES + self.k - 1], self.k)
+            self.pending.append(codes)
+            self.pending_size += len(codes)
+            if self.pending_size >= CHUNK_BASES:
+                self.flush()
+
+    def flush(self):
+        """Counts the pending k-mers into the summaries"""
+        if not self.pending:
+            return
+        codes, times = np.unique(np.concatenate(self.pending), return_counts=True)
+        self.pending, self.pending_size = [], 0
+        if len(codes):
+            self.sketch.add(codes, times)
+            self.summary.add(codes, times, self.sketch.estimate(codes))
+
+    def add_file(self, f):
+        for _, _, seq in record_cache.iter_records(f):
+            self.add(seq)
+        self.flush()
+        return self
+
+    def merge(self, other):
+        if self.k != other.k:
+            raise ValueError("Only k-mers of the same length can be merged")
+        self.flush()
+        other.flush()
+        self.sketch.merge(other.sketch)
+        self.summary.merge(other.summary)
+        return self
+
+    def top(self, n=None):
+        """The n heaviest k-mers (all the candidates when n is None), heaviest first.
+        Returns list of (k-mer, estimate, lower bound), the estimate is never below the true count"""
+        self.flush()
+        if not self.summary.counters:
+            return []
+        codes = np.fromiter(self.summary.counters, dtype=np.int64, count=len(self.summary.counters))
+        sketched = self.sketch.estimate(codes).tolist()
+        found = []
+        for code, sketch_count in zip(codes.tolist(), sketched):
+            count, error = self.summary.counters[code]
+            found.append((kmer_counts.decode(code, self.k), min(count, sketch_count), max(count - error, 0)))
+        found.sort(key=lambda hit: (-hit[1], -hit[2]))
+        return found if n is None else found[:n]
+
+    def most_frequent(self):
+        """The k-mers with the highest estimate, like repeats.most_frequent"""
+        found = self.top()
+        return [hit for hit in found if hit[1] == found[0][1]]
+
+
+def summarize(f, N, width=WIDTH, depth=DEPTH, capacity=CAPACITY, seed=SEED):
+    return HeavyHitters(N, width, depth, capacity, seed).add_file(f)
+
+
+def summarize_files(files, N, width=WIDTH, depth=DEPTH, capacity=CAPACITY, seed=SEED, workers=1):
+    """Summarizes every file (in a pool of workers processes when workers > 1) and merges the summaries"""
+    arguments = [(f, N, width, depth, capacity, seed) for f in files]
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(summarize, *zip(*arguments)))
+    else:
+        summaries = [summarize(*args) for args in arguments]
+    merged = summaries[0]
+    for summary in summaries[1:]:
+        merged.merge(summary)
+    return merged
+
+
+def most_freq_repeat(N, f, width=WIDTH, depth=DEPTH, capacity=CAPACITY):
+    """Approximate repeats.most_freq_repeat: the repeats with the highest estimate.
+    Returns list of (repeat, estimate, lower bound), and the (overcount, probability) bound of the
+    count-min sketch"""
+    hitters = summarize(f, N, width, depth, capacity)
+    return [hit for hit in hitters.most_frequent() if hit[1] >= 2], hitters.sketch.error_bound()
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hn:k:W:d:c:w:')
+    options = dict(optional_args)
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+
+    hitters = summarize_files(required_args, int(options.get('-n', 12)), int(options.get('-W', WIDTH)),
+                              int(options.get('-d', DEPTH)), int(options.get('-c', CAPACITY)),
+                              workers=int(options.get('-w', 1)))
+    found = hitters.top(int(options['-k'])) if '-k' in options else hitters.most_frequent()
+    overcount, probability = hitters.sketch.error_bound()
+    print("%d k-mers, count-min overcount <= %d with probability %.4f" % (hitters.sketch.total, overcount,
+                                                                           probability))
+    for repeat, estimate, lower in found:
+        print("%s\t%d\t%d" % (repeat, estimate, lower))
@@ -0,0 +1,219 @@
+import os
+import sys
+import shutil
+import getopt
+import tempfile
+import numpy as np
+import compressed
+import record_cache
+import kmer_counts
+
+"""Out of core k-mer counting, for files whose distinct k-mers don't fit in memory.
+The k-mers are the 2-bit packed codes of kmer_counts (so the same rules: only ACGT windows, lowercase counted as
+uppercase, k up to kmer_counts.MAX_PACKED_K). While the records are streamed the k-mers of every chunk are counted
+with np.unique and each (code, count) pair is hashed and appended to one of many bucket files on disk according to
+the first bits of the hash of its code, all the pairs of a k-mer landing in the same bucket. A k-mer repeated all
+over a chunk (poly-A, satellites) is so written once per chunk and not once per occurrence. The buckets are then
+summed one at a time, so the peak memory is set by the size of a bucket and not by the number of distinct k-mers:
+the number of buckets is chosen from the size of the input (decompressed, see compressed.decompressed_size) and
+the memory budget, and a bucket that still comes out too big is split again on the next bits of the hash.
+The bucket files live in a temporary directory (TMPDIR, or the tmpdir argument) removed at the end."""
+
+
+def usage():
+    print(
+        """Most frequent repeats of length N, or all of them, counted on disk within a memory budget.
+
+Usage:
+    kmer_spill.py [-h] [-n <N>] [-m <MB>] [-t <dir>] [-d <output>] <filename>
+
+    -h                  means print this message
+    -n <N>              repeat length (default = 12)
+    -m <MB>             memory budget in megabytes (default = 256)
+    -t <dir>            directory of the bucket files (default = system temporary directory)
+    -d <output>         write all the repeats and their count to <output> (- for stdout), one per line
+    <filename>          FASTA file name
+""")
+
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # Fibonacci hashing: the high bits of the product are well mixed
+BUCKET_BITS = 8  # a pass writes at most 2 ** BUCKET_BITS buckets
+SORT_OVERHEAD = 3  # summing a bucket holds the pairs, their order and their sorted copy
+CODE_BYTES = np.dtype(np.int64).itemsize
+PAIR = np.dtype([("code", np.int64), ("times", np.int64)])  # a k-mer and its count, as written to a bucket file
+
+
+def bucket_of(codes, level, bits):
+    """Bucket of every code at a partitioning level, from bits bits of the hash starting after the first level*bits"""
+    hashes = codes.astype(np.uint64) * HASH_MULTIPLIER
+    return ((hashes << np.uint64(level * bits)) >> np.uint64(64 - bits)).astype(np.intp)
+
+
+def sum_pairs(pairs):
+    """(codes, times) of the pairs, the counts of every code summed, sorted by code"""
+    return kmer_counts.merge_tables([(pairs["code"], pairs["times"])])
+
+
+class BucketWriter:
+    """Appends (code, count) pairs to the bucket files of a directory, keeping at most buffer_bytes of them in
+    memory"""
+    def __init__(self, directory, level, bits, buffer_bytes):
+        self.paths = [os.path.join(directory, "%03d.bin" % bucket) for bucket in range(2 ** bits)]
+        self.level = level
+        self.bits = bits
+        self.buffer_bytes = buffer_bytes
+        self.pending = [[] for _ in self.paths]
+        self.pending_bytes = 0
+
+    def add(self, codes, times):
+        buckets = bucket_of(codes, self.level, self.bits)
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(len(self.paths) + 1))
+        pairs = np.empty(len(codes), dtype=PAIR)
+        pairs["code"] = codes[order]
+        pairs["times"] = times[order]
+        for bucket in np.flatnonzero(np.diff(bounds)).tolist():
+            self.pending[bucket].append(pairs[bounds[bucket]:bounds[bucket + 1]])
+        self.pending_bytes += pairs.nbytes
+        if self.pending_bytes > self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        for path, pending in zip(self.paths, self.pending):
+            if pending:
+                with open(path, "ab") as out:
+                    np.concatenate(pending).tofile(out)
+                pending.clear()
+        self.pending_bytes = 0
+
+    def buckets(self):
+        self.flush()
+        return [path for path in self.paths if os.path.exists(path)]
+
+
+def bucket_count(input_bytes, memory_budget):
+    """Number of hash bits so that a bucket of the input is expected to be counted within the memory budget"""
+    # at worst every k-mer of a chunk is distinct and gets its own pair
+    needed = input_bytes * PAIR.itemsize * SORT_OVERHEAD / memory_budget
+    bits = 0
+    while 2 ** bits < needed and bits < BUCKET_BITS:
+        bits += 1
+    return bits
+
+
+def spill(seqs, k, directory, memory_budget, input_bytes):
+    """Writes the (code, count) pairs of the k-mers of the sequences, chunk by chunk, to bucket files in directory.
+    Returns their paths"""
+    # the buffers and the codes of the chunk being hashed use half of the budget
+    chunk_bases = max(k, memory_budget // (8 * CODE_BYTES))
+    writer = BucketWriter(directory, 0, max(1, bucket_count(input_bytes, memory_budget)), memory_budget // 4)
+    for seq in seqs:
+        # long records are cut in chunks overlapping by k - 1 bases, so every window is in exactly one chunk
+        for start in range(0, max(1, len(seq) - k + 1), chunk_bases):
+            writer.add(*np.unique(kmer_counts.kmer_codes(seq[start:start + chunk_bases + k - 1], k),
+                                  return_counts=True))
+    return writer.buckets()
+
+
+def count_bucket(path, memory_budget, level=0, bits=BUCKET_BITS):
+    """Yields (codes, times) arrays of the k-mers of a bucket file, summing the counts of their pairs, splitting it
+    on the next hash bits when it is too big to be summed within the memory budget. The bucket file is removed once
+    counted"""
+    size = os.path.getsize(path)
+    if size * SORT_OVERHEAD <= memory_budget or (level + 2) * bits > 64:
+        pairs = np.fromfile(path, dtype=PAIR)
+        os.remove(path)
+        yield sum_pairs(pairs)
+        return
+    directory = path + ".split"
+    os.mkdir(directory)
+    writer = BucketWriter(directory, level + 1, bits, memory_budget // 4)
+    with open(path, "rb") as file:
+        while True:
+            pairs = np.fromfile(file, dtype=PAIR, count=memory_budget // (8 * PAIR.itemsize))
+            if not len(pairs):
+                break
+            # the pairs of a code read together are summed first, the split buckets are no bigger than needed
+            writer.add(*sum_pairs(pairs))
+    os.remove(path)
+    for sub_path in writer.buckets():
+        yield from count_bucket(sub_path, memory_budget, level + 1, bits)
+    os.rmdir(directory)
+
+
+def iter_counts(f, k, memory_budget=DEFAULT_MEMORY_BUDGET, tmpdir=None):
+    """Yields (codes, times) arrays, bucket by bucket, covering every distinct k-mer of the FASTA file once"""
+    if k > kmer_counts.MAX_PACKED_K:
+        raise ValueError("k-mers longer than %d bases do not fit a 64 bit code" % kmer_counts.MAX_PACKED_K)
+    directory = tempfile.mkdtemp(prefix="kmer_spill.", dir=tmpdir)
+    try:
+        seqs = (seq for _, _, seq in record_cache.iter_records(f))
+        # a compressed input is sized by its decompressed content, a bucket still too big is split by count_bucket
+        for path in spill(seqs, k, directory, memory_budget, compressed.decompressed_size(f)):
+            yield from count_bucket(path, memory_budget)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def most_freq_repeat(N, f, memory_budget=DEFAULT_MEMORY_BUDGET, tmpdir=None):
+    """Same answer as repeats.most_freq_repeat(N, f, packed=True), computed bucket by bucket.
+    Returns a tuple with the list of the repeats occurring the most and how many times they occur"""
+    max_freq = 0
+    most_frequent = []
+    for codes, times in iter_counts(f, N, memory_budget, tmpdir):
+        if not len(times) or times.max() < max(max_freq, 2):
+            continue
+        if times.max() > max_freq:
+            max_freq = int(times.max())
+            most_frequent = []
+        most_frequent += codes[times == max_freq].tolist()
+    if not most_frequent:
+        raise ValueError("No repeat of length %d" % N)
+    return [kmer_counts.decode(code, N) for code in most_frequent], max_freq
+
+
+def write_repeats(N, f, out, memory_budget=DEFAULT_MEMORY_BUDGET, tmpdir=None, min_times=2):
+    """Writes every repeat of length N and its count, tab separated, to the open text file out.
+    Returns the number of repeats written. The repeats come bucket by bucket, not sorted"""
+    written = 0
+    for codes, times in iter_counts(f, N, memory_budget, tmpdir):
+        keep = times >= min_times
+        for code, n in zip(codes[keep].tolist(), times[keep].tolist()):
+            out.write("%s\t%d\n" % (kmer_counts.decode(code, N), n))
+        written += int(keep.sum())
+    return written
+
+
+def all_repeats_in_all_seqs(N, f, memory_budget=DEFAULT_MEMORY_BUDGET, tmpdir=None):
+    """Same result as kmer_counts.all_repeats_in_all_seqs, counted on disk. Only the repeats are held in memory
+    Returns dict of repeats: times"""
+    repeats = {}
+    for codes, times in iter_counts(f, N, memory_budget, tmpdir):
+        repeats.update(kmer_counts.repeats_from_counts(dict(zip(codes.tolist(), times.tolist())), N))
+    return repeats
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hn:m:t:d:')
+    options = dict(optional_args)
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+    N = int(options.get('-n', 12))
+    memory_budget = int(float(options.get('-m', 256)) * 1024 ** 2)
+    tmpdir = options.get('-t')
+    if '-d' in options:
+        if options['-d'] == '-':
+            write_repeats(N, required_args[0], sys.stdout, memory_budget, tmpdir)
+        else:
+            try:
+                out = open(options['-d'], 'w')
+            except IOError:
+                sys.exit("Error opening file")
+            with out:
+                written = write_repeats(N, required_args[0], out, memory_budget, tmpdir)
+            print(written, "repeats written to", options['-d'])
+    else:
+        most_freq_repeats, times = most_freq_repeat(N, required_args[0], memory_budget, tmpdir)
+        print('Most frequent repeats are:', most_freq_repeats, " and they occur", times, "times")
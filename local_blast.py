@@ -0,0 +1,173 @@
+import sys
+import math
+import getopt
+import numpy as np
+import record_cache
+import kmer_counts
+import revcomp
+
+
+def usage():
+    print(
+        """Offline nucleotide search, a local alternative to NCBIWWW.qblast for a reference FASTA file we provide.
+A k-mer index of the reference (ACGT words only) gives the seed hits of every query, each seed is extended without gaps in both
+directions (X-drop) and the hits are scored like blastn (match +1, mismatch -2) with a Karlin-Altschul e-value.
+Both strands are searched, for the hits on the minus strand the query is shown reverse complemented.
+
+Usage:
+    local_blast.py [-h] [-k <word size>] [-e <e value>] [-l] <reference> <queries>
+
+    -h                  means print this message
+    -k <word size>      seed length (default = 11)
+    -e <e value>        only report the hits with an e value below <e value> (default = 10)
+    -l                  only the alignment with the lowest e value, like blast_lowest_e.py
+    <reference>         FASTA file to search
+    <queries>           FASTA file of the query sequences
+""")
+
+
+WORD_SIZE = 11
+MATCH, MISMATCH = 1, -2
+X_DROP = 20
+# Karlin-Altschul parameters of ungapped blastn with the +1/-2 scores
+LAMBDA, K = 1.28, 0.46
+
+
+class Alignment:
+    """A reference record with its hits, shaped like the Bio.Blast.Record alignments printed by the scripts"""
+    def __init__(self, title, length):
+        self.title = title
+        self.length = length
+        self.hsps = []
+
+
+class HSP:
+    """High scoring pair: the aligned query and subject strings and the match line between them"""
+    def __init__(self, score, expect, query, match, sbjct, query_start, sbjct_start, strand):
+        self.score = score
+        self.bits = (LAMBDA * score - math.log(K)) / math.log(2)
+        self.expect = expect
+        self.query = query
+        self.match = match
+        self.sbjct = sbjct
+        self.query_start = query_start
+        self.sbjct_start = sbjct_start
+        self.strand = strand
+
+
+class ReferenceIndex:
+    """k-mer index of the reference records: the 2-bit packed codes of kmer_counts of every ACGT k-mer of the
+    forward strand, sorted, with the record and the position of each, so the hits of a word are a searchsorted range"""
+    def __init__(self, f, word_size=WORD_SIZE):
+        if word_size > kmer_counts.MAX_PACKED_K:
+            raise ValueError("Words longer than %d bases do not fit a 64 bit code" % kmer_counts.MAX_PACKED_K)
+        self.word_size = word_size
+        self.records = []
+        codes, numbers, positions = [], [], []
+        for number, (identifier, description, seq) in enumerate(record_cache.iter_records(f)):
+            seq = seq.upper()
+            self.records.append((identifier, description, seq))
+            kmers, valid = kmer_counts.kmer_windows(seq, word_size)
+            codes.append(kmers[valid])
+            positions.append(np.flatnonzero(valid))
+            numbers.append(np.full(len(codes[-1]), number, dtype=np.int32))
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+        # stable, so the hits of a word stay in (record, position) order
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.numbers = np.concatenate(numbers)[order] if numbers else np.zeros(0, dtype=np.int32)
+        self.positions = np.concatenate(positions)[order] if positions else np.zeros(0, dtype=np.intp)
+        self.total_length = sum(len(seq) for _, _, seq in self.records)
+
+    def hits(self, query):
+        """Yields (query position, hit numbers, hit positions) for the ACGT words of the query found in the index"""
+        kmers, valid = kmer_counts.kmer_windows(query, self.word_size)
+        starts = np.searchsorted(self.codes, kmers, "left")
+        ends = np.searchsorted(self.codes, kmers, "right")
+        for q in np.flatnonzero(valid & (ends > starts)).tolist():
+            yield q, self.numbers[starts[q]:ends[q]].tolist(), self.positions[starts[q]:ends[q]].tolist()
+
+    def expect(self, score, query_length):
+        return K * query_length * self.total_length * math.exp(-LAMBDA * score)
+
+    def search(self, query, max_expect=10.0):
+        """Returns the list of Alignment objects with hits of the query, best e value first"""
+        query = query.upper()
+        hsps = {}
+        for strand, strand_query in ((1, query), (-1, revcomp.reverse_complement(query))):
+            extended = {}  # (record, diagonal): query position where the last extension on it ended
+            for q, numbers, positions in self.hits(strand_query):
+                for number, s in zip(numbers, positions):
+                    if q < extended.get((number, s - q), -1):
+                        continue  # the seed is inside a hit already extended on the same diagonal
+                    hsp = self.extend(strand_query, q, number, s, strand)
+                    extended[(number, s - q)] = hsp.query_start - 1 + len(hsp.query)
+                    if hsp.expect <= max_expect:
+                        hsps.setdefault(number, []).append(hsp)
+        alignments = []
+        for number, record_hsps in hsps.items():
+            identifier, description, seq = self.records[number]
+            alignment = Alignment((identifier + " " + description).strip(), len(seq))
+            alignment.hsps = sorted(record_hsps, key=lambda hsp: hsp.expect)
+            alignments.append(alignment)
+        return sorted(alignments, key=lambda alignment: alignment.hsps[0].expect)
+
+    def extend(self, query, q, number, s, strand):
+        """Ungapped X-drop extension of the seed at query position q and subject position s"""
+        seq = self.records[number][2]
+        score = self.word_size * MATCH
+        best_right, right, running = 0, 0, score
+        while q + self.word_size + right < len(query) and s + self.word_size + right < len(seq):
+            running += MATCH if query[q + self.word_size + right] == seq[s + self.word_size + right] else MISMATCH
+            right += 1
+            if running > score + best_right:
+                best_right = running - score
+                best_right_len = right
+            elif running < score + best_right - X_DROP:
+                break
+        right = best_right_len if best_right else 0
+        score += best_right
+        best_left, left, running = 0, 0, score
+        while q - left > 0 and s - left > 0:
+            left += 1
+            running += MATCH if query[q - left] == seq[s - left] else MISMATCH
+            if running > score + best_left:
+                best_left = running - score
+                best_left_len = left
+            elif running < score + best_left - X_DROP:
+                break
+        left = best_left_len if best_left else 0
+        score += best_left
+        query_part = query[q - left:q + self.word_size + right]
+        sbjct_part = seq[s - left:s + self.word_size + right]
+        match = "".join("|" if a == b else " " for a, b in zip(query_part, sbjct_part))
+        return HSP(score, self.expect(score, len(query)), query_part, match, sbjct_part,
+                   q - left + 1, s - left + 1, strand)
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hk:e:l')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 2:
+        usage()
+        sys.exit()
+
+    index = ReferenceIndex(required_args[0], int(options.get('-k', WORD_SIZE)))
+    E_value_threshold = float(options.get('-e', 10))
+    for query_id, _, query in record_cache.iter_records(required_args[1]):
+        alignments = index.search(query, E_value_threshold)
+        if '-l' in options:
+            alignments = alignments[:1]
+            for alignment in alignments:
+                alignment.hsps = alignment.hsps[:1]
+        for alignment in alignments:
+            for hsp in alignment.hsps:  # hsp -> High scoring pairs
+                print('*** Alignment ***')
+                print('query:', query_id)
+                print('sequence:', alignment.title)
+                print('length:', alignment.length)
+                print('e value:', hsp.expect)
+                print(hsp.query)
+                print(hsp.match)
+                print(hsp.sbjct)
@@ -0,0 +1,148 @@
+import sys
+import getopt
+import re
+import record_cache
+import revcomp
+
+
+def usage():
+    print(
+        """Scans all the records of a FASTA file for many motifs at once, i.e. the donor splice site GT of new.py.
+The motifs can use the IUPAC codes (R, Y, S, W, K, M, B, D, H, V, N). An exact motif is searched with str.find,
+a degenerate one is a regular expression of character classes, and so is its reverse complement: no motif is
+expanded to the sequences it stands for. The records are read once. Matching is case insensitive.
+
+Usage:
+    motif_scan.py [-h] [-p <motifs>] [-m <motif file>] [-f] <filename>
+
+    -h                  means print this message
+    -p <motifs>         comma separated motifs, i.e. GT,TATAWAW
+    -m <motif file>     one motif per line, as <pattern> or <name> <pattern>
+    -f                  forward strand only
+    <filename>          FASTA file name
+
+Output: identifier, motif name, strand, start (1-based), end
+""")
+
+
+IUPAC = {
+    "A": "A", "C": "C", "G": "G", "T": "T", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT",
+}
+STRANDS = ("+", "-")
+
+
+def classes(pattern):
+    """The ACGT bases allowed at every position of an IUPAC pattern"""
+    pattern = pattern.upper()
+    if not pattern:
+        raise ValueError("Empty motif")
+    try:
+        return [IUPAC[code] for code in pattern]
+    except KeyError as error:
+        raise ValueError("%s is not an IUPAC code (motif %s)" % (error.args[0], pattern))
+
+
+class Motif:
+    """One motif on one strand, matched on the uppercase sequence: an exact motif with str.find, a degenerate one
+    with a regular expression of character classes, never expanded to the sequences it stands for.
+    Both find the overlapping hits, in the order of their start"""
+    def __init__(self, name, pattern, strand):
+        self.name = name
+        self.strand = strand
+        bases = classes(pattern if strand == "+" else revcomp.reverse_complement(pattern.upper()))
+        self.length = len(bases)
+        self.word = "".join(bases) if all(len(choices) == 1 for choices in bases) else None
+        if self.word is None:
+            self.regex = re.compile("(?=%s)" % "".join(
+                choices if len(choices) == 1 else "[%s]" % choices for choices in bases))
+        # a palindromic site is reported once, on the + strand
+        self.skip_palindromes = strand == "-" and all(
+            set(choices) & set(revcomp.reverse_complement(mirror))
+            for choices, mirror in zip(bases, reversed(bases)))
+
+    def starts(self, seq):
+        """0-based starts of the hits in the uppercase sequence seq"""
+        if self.word is not None:
+            starts = []
+            start = seq.find(self.word)
+            while start >= 0:
+                starts.append(start)
+                start = seq.find(self.word, start + 1)
+        else:
+            starts = [match.start() for match in self.regex.finditer(seq)]
+        if self.skip_palindromes:
+            starts = [start for start in starts if not is_palindrome(seq[start:start + self.length])]
+        return starts
+
+
+def is_palindrome(site):
+    return revcomp.reverse_complement(site) == site
+
+
+class MotifScanner:
+    """All the motifs of a scan, with their reverse complements. Each motif is a pass over the record at C speed,
+    through str.find or re, so the cost is in the number of hits rather than in the number of bases"""
+    def __init__(self, motifs, both_strands=True):
+        """motifs is a list of (name, IUPAC pattern)"""
+        self.motifs = []
+        for name, pattern in motifs:
+            for strand in STRANDS[:2 if both_strands else 1]:
+                self.motifs.append(Motif(name, pattern, strand))
+        # motifs with the same name could report the same site twice
+        keys = [(motif.name, motif.strand, motif.length) for motif in self.motifs]
+        self.duplicates = len(set(keys)) < len(keys)
+
+    def scan(self, seq):
+        """Yields (motif name, strand, start, end) of every hit in seq, 0-based and end excluded, by increasing
+        end, the longest motif first. Matching is case insensitive and a base other than A, C, G or T can't be
+        part of a hit. Motifs with the same name report a site once"""
+        seq = seq.upper()
+        hits = []
+        for order, motif in enumerate(self.motifs):
+            hits.extend((start + motif.length, -motif.length, order, start) for start in motif.starts(seq))
+        if len(self.motifs) > 1:
+            hits.sort()
+        seen = set()
+        for end, _, order, start in hits:
+            motif = self.motifs[order]
+            if self.duplicates:
+                key = (motif.name, motif.strand, start, end)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield motif.name, motif.strand, start, end
+
+    def scan_file(self, f):
+        """Yields (identifier, motif name, strand, start, end) for all the records of the FASTA file"""
+        for identifier, _, seq in record_cache.iter_records(f):
+            for hit in self.scan(seq):
+                yield (identifier,) + hit
+
+
+def read_motifs(path):
+    motifs = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            motifs.append((fields[0], fields[1]) if len(fields) > 1 else (fields[0], fields[0]))
+    return motifs
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hp:m:f')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 1 or not ('-p' in options or '-m' in options):
+        usage()
+        sys.exit()
+
+    motifs = [(pattern, pattern) for pattern in options.get('-p', '').split(",") if pattern]
+    if '-m' in options:
+        motifs += read_motifs(options['-m'])
+    scanner = MotifScanner(motifs, both_strands='-f' not in options)
+    for identifier, name, strand, start, end in scanner.scan_file(required_args[0]):
+        print("%s\t%s\t%s\t%d\t%d" % (identifier, name, strand, start + 1, end))
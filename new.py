@@ -4,6 +4,8 @@
 import os
 from time import process_time
 import random
+import revcomp
+import compressed
 
 dna = "atgcaaagtaccggt"
 c = dna.count("c")
@@ -106,8 +108,8 @@ def gc(dna):
     # remove possible undefined bases
     number_of_undefined_bases = dna.count("N") + dna.count("n")
     bases_to_check = len(dna) - number_of_undefined_bases
-    g = dna.count('g')
-    c = dna.count('c')
+    g = dna.count('g') + dna.count('G')
+    c = dna.count('c') + dna.count('C')
     return (g + c) * 100 / bases_to_check
 # print(gc(dna))
 # print(help(gc))
@@ -133,10 +135,8 @@ dna = "AIGTGTGGGGCG"
 
 
 def reverse_complement(dna):
-    "Return the complementary string sequence"
-    complements = dict(a="t", t="a", g="c", c="g", n="n")
-    list_of_complementary_bases = [complements[base.lower()] for base in reverse_string(dna) if base.lower() in complements]
-    return "".join(list_of_complementary_bases)
+    "Return the complementary string sequence, IUPAC codes included and case kept (see revcomp.py)"
+    return revcomp.reverse_complement(dna)
 
 
 # print(reverse_complement(dna))
@@ -150,8 +150,9 @@ def compute(n, x, y):
 
 # Fastest counts
 
-def create_long_dna(n, alphabet="ACGT"):
-    return "".join([random.choice(alphabet) for i in range(n)])
+def create_long_dna(n, alphabet="ACGT", rng=random):
+    """rng can be a seeded random.Random to get the same sequence on every run"""
+    return "".join([rng.choice(alphabet) for i in range(n)])
 
 
 def count1(dna, base):
@@ -202,25 +203,22 @@ def count6(dna, base):
     return count, elapsed, "count6"
 
 
-Dna = create_long_dna(1000000)
+COUNT_FUNCTIONS = [count1, count3, count2, count4, count5, count6]
 
-data = [count1(Dna, "T"),
-        count3(Dna, "T"),
-        count2(Dna, "T"),
-        count4(Dna, "T"),
-        count5(Dna, "T"),
-        count6(Dna, "T")]
 
-fastest_function = min(data, key=lambda t: t[1])
-whichFn, seconds = fastest_function[2], fastest_function[1]
-# print("Min is {} with {} seconds".format(whichFn, seconds))
+def fastest_count(dna, base="T"):
+    """Runs all the count functions on dna and returns (name, seconds) of the fastest one.
+    benchmark.py times them, among the rest of the repository, on reproducible inputs"""
+    data = [count(dna, base) for count in COUNT_FUNCTIONS]
+    fastest_function = min(data, key=lambda t: t[1])
+    return fastest_function[2], fastest_function[1]
 # count 4 wins. Basically the python implementation of count wins
 
 
 def read_FASTA(file_name):
     """Returns a dictionary of the sequences read where the keys are the seq. names"""
     try:
-        file = open(file_name)
+        file = compressed.open_fasta(file_name)
     except IOError:
         print('No file found', file_name)
         return None
@@ -239,7 +237,12 @@ def read_FASTA(file_name):
 # print(read_FASTA(os.path.expanduser("~/Desktop/fasta_example.fa")))
 
 
-# print to file
-file = open(os.path.expanduser("~/Desktop/my-test.txt"), "w+")
-file.write("%s" % to_print)
-file.close()
+if __name__ == "__main__":
+    Dna = create_long_dna(1000000)
+    whichFn, seconds = fastest_count(Dna)
+    # print("Min is {} with {} seconds".format(whichFn, seconds))
+
+    # print to file
+    file = open(os.path.expanduser("~/Desktop/my-test.txt"), "w+")
+    file.write("%s" % to_print)
+    file.close()
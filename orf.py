@@ -1,5 +1,14 @@
+import re
 import read_fasta
+import record_cache
+import fasta_index
+import revcomp
+import sequence_store
 import sys
+import getopt
+import heapq
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import seq_lengths
 
 """
@@ -35,32 +44,70 @@ def is_STOP_codon(reading_frame):
     return reading_frame in ('TAA', 'TAG', 'TGA')
 
 
+CODONS = re.compile(r"(?=(ATG|TAA|TAG|TGA))")
+
+
+def orfs_in_strand(seq, nested=False):
+    """ Single pass over one strand: the start and stop codons of all three frames are located in one regex scan,
+        every frame keeps the starts still waiting for their stop and an ORF is closed when the stop shows up.
+        No part of the sequence is scanned twice, whatever the number of in-frame ATGs.
+        Yields (zero_index_pos, start, end), end excluded, as soon as the stop is reached. With nested=False only
+        the outermost ORF of every stop (the one from its first ATG) is reported, otherwise one ORF per ATG."""
+    open_starts = ([], [], [])
+    for m in CODONS.finditer(seq):
+        i = m.start()
+        frame_starts = open_starts[i % 3]
+        if m.group(1) == "ATG":
+            if nested or not frame_starts:
+                frame_starts.append(i)
+        elif frame_starts:
+            for start in frame_starts:
+                yield i % 3, start, i + 3
+            frame_starts.clear()
+
+
+def find_orfs(seq, min_length=0, nested=False, strands=(1, -1), backend="python"):
+    """ All ORFs of the six reading frames of a sequence, found in linear time.
+        Frames are 1, 2, 3 on the forward strand and -1, -2, -3 on the reverse complement (frame -1 starts
+        at the last base of the sequence). Coordinates are 0-based on the forward strand, end excluded,
+        so seq[start:end] is the ORF for forward frames and its reverse complement for reverse frames.
+        backend="numpy" pairs the codons with the vectorized orf_vectorized module instead of the pure-Python scan.
+        Yields (frame, start, end, ORF) for the ORFs at least min_length long"""
+    # a SequenceStore record view is read as a str by the regex scan
+    seq = str(seq)
+    if backend == "numpy":
+        import orf_vectorized
+        strand_orfs = orf_vectorized.orfs_in_strand
+    else:
+        strand_orfs = orfs_in_strand
+    length = len(seq)
+    for strand in strands:
+        strand_seq = seq if strand == 1 else revcomp.reverse_complement(seq)
+        for p, start, end in strand_orfs(strand_seq, nested):
+            if end - start < min_length:
+                continue
+            if strand == 1:
+                yield p + 1, start, end, strand_seq[start:end]
+            else:
+                yield -(p + 1), length - end, length - start, strand_seq[start:end]
+
+
 def startstop_codon(zero_index_pos, seq):
-    for i in range(zero_index_pos, len(seq), 3):
-        codon1 = seq[i:i + 3]
-        if is_START_codon(codon1):
-            position1 = i
-            for j in range(position1, len(seq), 3):
-                codon2 = seq[j:j + 3]
-                if is_STOP_codon(codon2):
-                    position2 = j
-                    yield (zero_index_pos + 1, position2 - position1 + 3, seq[position1:position2 + 3])
-                    break
+    """ Every ORF (one per ATG) of the forward frame starting at zero_index_pos
+        Yields (reading_frame_pos, ORF_length, ORF)"""
+    for p, start, end in orfs_in_strand(seq, nested=True):
+        if p == zero_index_pos:
+            yield (zero_index_pos + 1, end - start, seq[start:end])
 
 
 def longest_orfs_in_seq_per_pos(seq):
     """ The input is the sequence
         Returns a dict of reading_frame_pos : Tuple with (ORF_length, ORF) for a sequence """
-    orfs = {1: [], 2: [], 3: []}
-    for p in range(0, 3):
-        for pos, orflen, orf in startstop_codon(p, seq):
-            orfs[pos].append((orflen, orf))
-    longest_orfs = {}
-    count_total_orfs_found = 0
-    for pos, orf_list in orfs.items():
-        count_total_orfs_found += len(orf_list)
-        longest_orfs[pos] = max(orf_list, default=(0, ''), key=lambda item: item[0])
-    # print('Total orfs found to check against NCBI ORF Finder', count_total_orfs_found)
+    longest_orfs = {1: (0, ''), 2: (0, ''), 3: (0, '')}
+    # the outermost ORF of a stop is always longer than the nested ones, so they can't be the longest
+    for frame, start, end, orf in find_orfs(seq, strands=(1,)):
+        if end - start > longest_orfs[frame][0]:
+            longest_orfs[frame] = (end - start, orf)
     return longest_orfs
 
 
@@ -70,71 +117,166 @@ def longest_orf_in_seq(seq):
     orf_found = (1, 0, '')
     for pos, (length, orf) in longest_orfs_per_position.items():
         if length > longest_length:
+            longest_length = length
             orf_found = pos, length, orf
     return orf_found
 
 
-def records_with_longest_orfs(f):
+CHUNK_BASES = 1000000
+
+
+def size_balanced_chunks(records, chunk_bases=CHUNK_BASES):
+    """ Groups the (id, seq) records into lists holding about chunk_bases bases each,
+        so a pool gets many small contigs per task and a giant contig alone in its own task"""
+    chunk, chunk_size = [], 0
+    for id, seq in records:
+        chunk.append((id, seq))
+        chunk_size += len(seq)
+        if chunk_size >= chunk_bases:
+            yield chunk
+            chunk, chunk_size = [], 0
+    if chunk:
+        yield chunk
+
+
+def longest_orfs_of_chunk(chunk, pos=None):
+    """ Work done by one pool task: the longest ORF of every sequence of the chunk,
+        or the longest ORF of the given reading frame pos"""
+    if pos is None:
+        return [longest_orf_in_seq(seq) for _, seq in chunk]
+    return [longest_orfs_in_seq_per_pos(seq)[pos] for _, seq in chunk]
+
+
+def map_records(f, pos=None, workers=1, chunk_bases=CHUNK_BASES):
+    """ Yields (id, seq, longest ORFs) for every record of the file, in file order.
+        With workers > 1 the records are spread in size balanced chunks over a pool of processes. At most
+        2 * workers chunks are in flight, so the file is still streamed and a big chunk waiting for its result
+        leaves the other workers busy with the next ones"""
+    records = ((id, seq) for id, _, seq in record_cache.iter_records(f))
+    if workers <= 1:
+        for chunk in size_balanced_chunks(records, chunk_bases):
+            for (id, seq), orfs in zip(chunk, longest_orfs_of_chunk(chunk, pos)):
+                yield id, seq, orfs
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in size_balanced_chunks(records, chunk_bases):
+            pending.append((chunk, pool.submit(longest_orfs_of_chunk, chunk, pos)))
+            if len(pending) < 2 * workers:
+                continue
+            chunk, future = pending.popleft()
+            for (id, seq), orfs in zip(chunk, future.result()):
+                yield id, seq, orfs
+        for chunk, future in pending:
+            for (id, seq), orfs in zip(chunk, future.result()):
+                yield id, seq, orfs
+
+
+def records_with_longest_orfs(f, workers=1):
     """ What is the identifier of the sequence containing the longest ORF throughout the sequences in the whole fasta file?
         What is the starting position of the longest ORF in the sequence that contains it ? Starting position should be 1/2/3
         Returns dict(identifier, seq, reading frame starting position, longest ORF length and the ORF)"""
-    records = read_fasta.read(f)
     records_of_longest_orfs = {}
-    for id, seq in records.items():
+    # the sequences are kept in one SequenceStore buffer, "seq" is a RecordView of it rather than a str
+    store = sequence_store.SequenceStore()
+    for id, seq, orfs in map_records(f, workers=workers):
+        store.add(id, seq)
         records_of_longest_orfs[id] = {
-            "seq": seq,
-            "orfs": longest_orf_in_seq(seq)
+            "seq": store[id],
+            "orfs": orfs
         }
     return records_of_longest_orfs
 
-def records_with_longest_orfs_at_pos (f,pos):
+def records_with_longest_orfs_at_pos (f,pos, workers=1):
     """ What is the identifier of the sequence containing the longest ORF throughout the sequences in the whole fasta file?
         What is the starting position of the longest ORF in the sequence that contains it ? Starting position should be 1/2/3
         Returns dict(identifier, seq, reading frame starting position, longest ORF length and the ORF)"""
-    records = read_fasta.read(f)
     records_of_longest_orfs = {}
-    for id, seq in records.items():
+    # the sequences are kept in one SequenceStore buffer, "seq" is a RecordView of it rather than a str
+    store = sequence_store.SequenceStore()
+    for id, seq, orfs in map_records(f, pos, workers):
+        store.add(id, seq)
         records_of_longest_orfs[id] = {
-            "seq": seq,
-            "orfs": longest_orfs_in_seq_per_pos(seq)[pos]
+            "seq": store[id],
+            "orfs": orfs
         }
     return records_of_longest_orfs
 
 
-def longest_ORF_in_file(f):
-    records = records_with_longest_orfs(f)
+def longest_ORF_in_file(f, workers=1):
+    records = records_with_longest_orfs(f, workers)
     longest_length = 0
-    longest = None
+    found = None, None, None
     for id, info in records.items():
-        if info['orfs'][1] > longest_length:
-            longest = info['orfs']
-    return id, info['seq'], longest
+        if found[0] is None or info['orfs'][1] > longest_length:
+            longest_length = info['orfs'][1]
+            found = id, info['seq'], info['orfs']
+    return found
 
 
-def longest_ORF_in_file_at_pos(f, pos):
-    records = records_with_longest_orfs_at_pos(f, pos)
+def longest_ORF_in_file_at_pos(f, pos, workers=1):
+    records = records_with_longest_orfs_at_pos(f, pos, workers)
     longest_length = 0
-    longest = None
+    found = None, None, pos, None
     for id, info in records.items():
         print(info['orfs'])
-        if info['orfs'][0] > longest_length:
-            longest = info['orfs']
-    return id, info['seq'], pos, longest
-
-
+        if found[0] is None or info['orfs'][0] > longest_length:
+            longest_length = info['orfs'][0]
+            found = id, info['seq'], pos, info['orfs']
+    return found
+
+
+def top_k_longest_orfs(f, k=10, min_length=0, strands=(1, -1)):
+    """ The k longest ORFs of the whole fasta file, found in one pass keeping only a heap of the k best.
+        A record no longer than the k-th best ORF so far can't hold a better one and is skipped without looking
+        for its ORFs, so memory stays O(k) and most records of a big file cost only their parsing.
+        Returns a list, longest first, of (identifier, frame, strand, start, end, length), with 0-based start
+        and end excluded on the forward strand, frame 1/2/3 and strand '+' or frame -1/-2/-3 and strand '-'"""
+    if k < 1:
+        return []
+    heap = []
+    order = 0  # ties keep the first ORF found
+    for id, _, seq in record_cache.iter_records(f):
+        if len(heap) == k and len(seq) <= heap[0][0]:
+            continue
+        for frame, start, end, _ in find_orfs(seq, min_length, strands=strands):
+            length = end - start
+            if len(heap) == k and length <= heap[0][0]:
+                continue
+            order -= 1
+            entry = (length, order, (id, frame, '+' if frame > 0 else '-', start, end, length))
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+    return [orf for _, _, orf in sorted(heap, reverse=True)]
 
 
 def longest_ORF_for_given_id(f, identifier):
     """For a given sequence identifier, what is the longest ORF contained in the sequence represented by that identifier?"""
-    records = read_fasta.read(f)
-    desired_seq = records[identifier]
+    try:
+        desired_seq = fasta_index.fetch(f, identifier)
+    except ValueError:
+        # lines of uneven width and compressed files can not be indexed, fall back to a scan of the file
+        desired_seq = read_fasta.read(f)[identifier]
     return longest_orf_in_seq(desired_seq)
 
 
 if __name__ == "__main__":
+    # -w <workers> spreads the records over a pool of <workers> processes
+    # -k <k> prints the k longest ORFs of the file on both strands instead
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'w:k:')
+    options = dict(optional_args)
+    workers = int(options.get('-w', 1))
+
+    if '-k' in options:
+        for id, frame, strand, start, end, length in top_k_longest_orfs(required_args[0], int(options['-k'])):
+            print(id, "frame", frame, "strand", strand, "from", start + 1, "to", end, "length", length)
+        sys.exit()
+
     # Longest ORF in whole file
 
-    # l = longest_ORF_in_file(sys.argv[1])
+    # l = longest_ORF_in_file(required_args[0], workers)
     # id = l[0]
     # seq = l[1]
     # start_pos = l[2][0]
@@ -151,7 +293,7 @@ if __name__ == "__main__":
     #     orf, "and the orf starts inside the sequence at pos: index + 1", index + 1)
 
     # Longest ORF in whole file at the given start position
-    l = longest_ORF_in_file_at_pos(sys.argv[1], 2)
+    l = longest_ORF_in_file_at_pos(required_args[0], 2, workers)
     id = l[0]
     seq = l[1]
     start_pos = l[2]
@@ -0,0 +1,70 @@
+import numpy as np
+
+"""NumPy backend for the codon work of orf.py.
+The sequence is encoded once as a uint8 array (A=0, C=1, G=2, T=3, anything else=4), the codon starting at every
+position gets an integer id 25*b1 + 5*b2 + b3 with array arithmetic, and the start / stop codons are found with
+boolean masks over the ids, so there is no interpreter work per codon.
+orf.is_START_codon, orf.is_STOP_codon and orf.orfs_in_strand stay the pure-Python reference implementation."""
+
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for code, base in enumerate("ACGT"):
+    BASE_CODES[ord(base)] = code
+
+
+def codon_id(codon):
+    return 25 * "ACGT".index(codon[0]) + 5 * "ACGT".index(codon[1]) + "ACGT".index(codon[2])
+
+
+IS_START = np.zeros(125, dtype=bool)
+IS_START[codon_id("ATG")] = True
+IS_STOP = np.zeros(125, dtype=bool)
+IS_STOP[[codon_id(codon) for codon in ("TAA", "TAG", "TGA")]] = True
+
+
+def encode(seq, ignore_case=False):
+    """uint8 array of base codes. Like orf.is_START_codon the codons are case sensitive unless ignore_case"""
+    if ignore_case:
+        seq = seq.upper()
+    return BASE_CODES[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def codon_ids(codes):
+    """Id of the codon starting at every position (len(codes) - 2 of them), frame p is codon_ids(codes)[p::3]"""
+    codes = codes.astype(np.int16)
+    return 25 * codes[:-2] + 5 * codes[1:-1] + codes[2:]
+
+
+def start_stop_positions(codes):
+    """Returns two sorted arrays with the positions of all start codons and all stop codons, all frames together"""
+    if len(codes) < 3:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    ids = codon_ids(codes)
+    return np.flatnonzero(IS_START[ids]), np.flatnonzero(IS_STOP[ids])
+
+
+def orfs_in_strand(seq, nested=False):
+    """Same ORFs as orf.orfs_in_strand, every start is paired with the next stop of its frame with searchsorted.
+    Returns a list of (zero_index_pos, start, end) sorted by frame and start"""
+    starts, stops = start_stop_positions(encode(seq))
+    orfs = []
+    for p in range(3):
+        frame_starts = starts[starts % 3 == p]
+        frame_stops = stops[stops % 3 == p]
+        next_stop = np.searchsorted(frame_stops, frame_starts)
+        closed = next_stop < len(frame_stops)
+        frame_starts, ends = frame_starts[closed], frame_stops[next_stop[closed]] + 3
+        if not nested:
+            # starts are sorted, the first one of every stop is the outermost ORF
+            ends, first = np.unique(ends, return_index=True)
+            frame_starts = frame_starts[first]
+        orfs.extend((p, int(start), int(end)) for start, end in zip(frame_starts, ends))
+    return orfs
+
+
+def has_STOP_codon(dna, frame=0):
+    """Vectorized new.has_STOP_codon: True if dna has an in-frame STOP codon from position frame"""
+    codes = encode(dna, ignore_case=True)
+    if len(codes) - frame < 3:
+        return False
+    return bool(IS_STOP[codon_ids(codes[frame:])[::3]].any())
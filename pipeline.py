@@ -0,0 +1,138 @@
+import sys
+import getopt
+import record_cache
+import orf
+import repeats
+import seq_lengths
+
+
+def usage():
+    print(
+        """Full report of a FASTA file in a single pass: the file is parsed once and every record goes through all the
+selected stages while it is in memory, then every stage gives its result.
+
+Usage:
+    pipeline.py [-h] [-s <stages>] [-n <N>] <filename>
+
+    -h                  means print this message
+    -s <stages>         comma separated stages among %s (default = all)
+    -n <N>              repeat length of the repeats stage (default = 12)
+    <filename>          FASTA file name
+""" % ", ".join(STAGES))
+
+
+STAGES = {}
+
+
+def stage(name):
+    """Registers a stage class under name. A stage gets every record through process(identifier, seq)
+    and returns its answer from result() once all the records went through"""
+    def register(cls):
+        STAGES[name] = cls
+        return cls
+    return register
+
+
+@stage("count")
+class CountStage:
+    """count_records: how many records are in the file"""
+    def __init__(self, **options):
+        self.count = 0
+
+    def process(self, identifier, seq):
+        self.count += 1
+
+    def result(self):
+        return self.count
+
+
+@stage("lengths")
+class LengthsStage:
+    """seq_lengths: length of every record, the longest and the shortest ones"""
+    def __init__(self, **options):
+        self.lengths = {}
+
+    def process(self, identifier, seq):
+        self.lengths[identifier] = len(seq)
+
+    def result(self):
+        if not self.lengths:
+            return {"lengths": {}, "longest": ([], 0), "shortest": ([], 0)}
+        return {
+            "lengths": self.lengths,
+            "longest": seq_lengths.longest_in_lengths(self.lengths),
+            "shortest": seq_lengths.shortest_in_lengths(self.lengths),
+        }
+
+
+@stage("orfs")
+class OrfsStage:
+    """orf: longest ORF (reading frame, length, ORF) of every record and the longest one of the file"""
+    def __init__(self, **options):
+        self.orfs = {}
+        self.longest = None
+
+    def process(self, identifier, seq):
+        found = orf.longest_orf_in_seq(seq)
+        self.orfs[identifier] = found
+        if self.longest is None or found[1] > self.longest[1][1]:
+            self.longest = (identifier, found)
+
+    def result(self):
+        return {"orfs": self.orfs, "longest": self.longest}
+
+
+@stage("repeats")
+class RepeatsStage:
+    """repeats: the most frequent repeats of length N and how many times they occur"""
+    def __init__(self, N=12, **options):
+        self.N = N
+        self.candidate_repeats = {}
+
+    def process(self, identifier, seq):
+        repeats.count_Nmers(seq, self.N, self.candidate_repeats)
+
+    def result(self):
+        found = repeats.only_repeats(self.candidate_repeats)
+        if not found:
+            return [], 0
+        return repeats.most_frequent(found)
+
+
+def run(f, stage_names=None, **options):
+    """Streams the records of the file once through the stages.
+    Returns dict of stage name: result"""
+    stages = {name: STAGES[name](**options) for name in (stage_names or STAGES)}
+    for identifier, _, seq in record_cache.iter_records(f):
+        for current in stages.values():
+            current.process(identifier, seq)
+    return {name: current.result() for name, current in stages.items()}
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hs:n:')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+
+    stage_names = options['-s'].split(",") if '-s' in options else None
+    for name in stage_names or []:
+        if name not in STAGES:
+            sys.exit("Unknown stage " + name)
+
+    report = run(required_args[0], stage_names, N=int(options.get('-n', 12)))
+    if "count" in report:
+        print("Records count:", report["count"])
+    if "lengths" in report:
+        print("Longest sequences and their length:", " ".join(report["lengths"]["longest"][0]),
+              "->", report["lengths"]["longest"][1])
+        print("Shortest sequences and their length:", " ".join(report["lengths"]["shortest"][0]),
+              "->", report["lengths"]["shortest"][1])
+    if "orfs" in report and report["orfs"]["longest"]:
+        identifier, (pos, length, found) = report["orfs"]["longest"]
+        print("Longest ORF is in", identifier, "at reading frame", pos, "and has length", length)
+    if "repeats" in report:
+        most_freq_repeats, times = report["repeats"]
+        print("Most frequent repeats are:", most_freq_repeats, " and they occur", times, "times")
@@ -1,6 +1,10 @@
 
 import sys
 import getopt
+import mmap
+import os
+import re
+import compressed
 
 
 def usage():
@@ -19,22 +23,105 @@ Usage:
 """)
 
 
-def read(f):
+def iter_records(f):
+    """Yields (identifier, description, sequence) for every record of a FASTA file, one record at a time.
+    Sequence lines are collected in a list and joined once per record, so assembling a record is linear
+    in its length and memory depends on the largest record rather than on the whole file.
+    gzip and BGZF compressed files are decompressed on the fly."""
+    try:
+        file = compressed.open_fasta(f)
+    except IOError:
+        sys.exit("Error opening file")
+    seq_name = None
+    description = ''
+    seq_lines = []
+    with file:
+        for line in file:
+            line = line.rstrip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                # means is a info line not nucleotide line
+                if seq_name is not None:
+                    yield seq_name, description, "".join(seq_lines)
+                header = line[1:].split(None, 1)
+                seq_name = header[0] if header else ''
+                description = header[1] if len(header) > 1 else ''
+                seq_lines = []
+            else:  # means i have nucleotides
+                seq_lines.append(line)
+    if seq_name is not None:
+        yield seq_name, description, "".join(seq_lines)
+
+
+HEADER = re.compile(rb"^>", re.MULTILINE)
+# a sequence line without its trailing whitespace, like line.rstrip() in iter_records
+SEQ_LINE = re.compile(rb"[^\r\n]*[^\s]")
+
+
+class MappedSequence:
+    """The sequence lines of one record as a window over a memory mapped FASTA file.
+    Nothing is copied until the bases are asked for: len() walks the lines of the window
+    and only the views are handed out, newlines and trailing whitespace are stripped on demand by tobytes()/str()."""
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def raw(self):
+        """memoryview of the record body, newlines included"""
+        return memoryview(self.buffer)[self.start:self.end]
+
+    def lines(self):
+        """memoryviews of the sequence lines, without the newlines and trailing whitespace"""
+        view = memoryview(self.buffer)
+        for m in SEQ_LINE.finditer(self.buffer, self.start, self.end):
+            yield view[m.start():m.end()]
+
+    def __len__(self):
+        return sum(m.end() - m.start() for m in SEQ_LINE.finditer(self.buffer, self.start, self.end))
+
+    def tobytes(self):
+        return b"".join(self.lines())
+
+    def __str__(self):
+        return self.tobytes().decode()
+
+
+def iter_records_mmap(f):
+    """Same as iter_records but memory maps the file read-only and yields (identifier, description, MappedSequence).
+    No line of the file is decoded or copied to walk the records, and several processes mapping the same file
+    share the pages of the OS cache. A gzip or BGZF compressed file can't be mapped, it is decompressed in memory."""
     try:
-        file = open(f)
+        kind = compressed.compression(f)
     except IOError:
         sys.exit("Error opening file")
-    seq_dictionary = {}
-    for line in file:
-        line = line.rstrip()
-        if line[0].startswith(">"):
-            # means is a info line not nucleotide line
-            seq_name = line.split()[0][1:]
-            seq_dictionary[seq_name] = ''
-        else:  # means i have nucleotides
-            seq_dictionary[seq_name] += line
-    file.close()
-    return seq_dictionary
+    if kind is not None:
+        buffer = compressed.read_bytes(f)
+    else:
+        with open(f, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = HEADER.search(buffer)
+    while header is not None:
+        header_end = buffer.find(b"\n", header.start())
+        if header_end == -1:
+            header_end = len(buffer)
+        next_header = HEADER.search(buffer, header_end)
+        record_end = next_header.start() if next_header is not None else len(buffer)
+        fields = buffer[header.start() + 1:header_end].decode().split(None, 1)
+        seq_name = fields[0] if fields else ''
+        description = fields[1] if len(fields) > 1 else ''
+        yield seq_name, description, MappedSequence(buffer, min(header_end + 1, record_end), record_end)
+        header = next_header
+
+
+def read(f):
+    """Returns a dictionary of the sequences read where the keys are the seq. identifiers"""
+    return {seq_name: seq for seq_name, _, seq in iter_records(f)}
 
 
 if __name__ == "__main__":
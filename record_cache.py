@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+import read_fasta
+
+"""Persistent cache of parsed FASTA records shared by the scripts of this repository.
+The first run over a FASTA file parses it with read_fasta.iter_records and, while the records are streamed to the
+caller, writes their sequences one after the other in a binary cache entry. The footer of the entry holds the ids,
+descriptions and offsets of the records and the size and mtime of the source file.
+Later runs memory map the entry and slice the records out of it without parsing anything.
+An entry is only used while the size and mtime of the source file match, so an edited file is parsed again.
+The least recently used entries are evicted when the cache directory grows over its size cap, and a file bigger
+than the cap is never stored. Whenever the cache can't be read or written the files are simply parsed.
+
+Environment:
+    FASTA_CACHE_DIR         cache directory (default = ~/.cache/fasta_records)
+    FASTA_CACHE_MAX_BYTES   size cap of the cache directory (default = 2 GB)
+    FASTA_NO_CACHE          when set, parse the files every time and do not write any entry
+"""
+
+MAGIC = b"FACACHE1"
+FOOTER = struct.Struct("<Q8s")  # footer length, magic
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def cache_dir():
+    return os.environ.get("FASTA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "fasta_records"))
+
+
+def max_cache_bytes():
+    return int(os.environ.get("FASTA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+
+def entry_path(f):
+    key = hashlib.sha1(os.path.abspath(f).encode()).hexdigest()
+    return os.path.join(cache_dir(), key + ".rec")
+
+
+def source_key(f):
+    stat = os.stat(f)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_entry(f):
+    """Returns (footer dict, mmap of the entry) if there is an up to date entry for f, otherwise None"""
+    path = entry_path(f)
+    try:
+        file = open(path, "rb")
+    except IOError:
+        return None
+    with file:
+        size = os.fstat(file.fileno()).st_size
+        if size < FOOTER.size:
+            return None
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    footer_length, magic = FOOTER.unpack(buffer[size - FOOTER.size:])
+    if magic != MAGIC:
+        return None
+    footer = json.loads(buffer[size - FOOTER.size - footer_length:size - FOOTER.size])
+    if footer["source"] != source_key(f):
+        return None
+    os.utime(path)  # the mtime of an entry is its last use, for the eviction
+    return footer, buffer
+
+
+def iter_cached(footer, buffer):
+    for seq_name, description, offset, length in zip(footer["ids"], footer["descriptions"],
+                                                     footer["offsets"], footer["lengths"]):
+        yield seq_name, description, buffer[offset:offset + length].decode()
+
+
+def iter_and_store(f):
+    """Parses f with read_fasta.iter_records and writes the cache entry while the records go through.
+    When the cache can't be written (FASTA_CACHE_DIR is not a directory, no permission, full disk) the records
+    are still all yielded, only the entry is given up"""
+    key = source_key(f)
+    try:
+        directory = cache_dir()
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        out = os.fdopen(fd, "wb")
+    except OSError:
+        yield from read_fasta.iter_records(f)
+        return
+    footer = {"source": key, "ids": [], "descriptions": [], "offsets": [], "lengths": []}
+    complete = False
+    try:
+        offset = 0
+        for seq_name, description, seq in read_fasta.iter_records(f):
+            if not out.closed:
+                data = seq.encode()
+                try:
+                    out.write(data)
+                except OSError:
+                    out.close()
+                footer["ids"].append(seq_name)
+                footer["descriptions"].append(description)
+                footer["offsets"].append(offset)
+                footer["lengths"].append(len(data))
+                offset += len(data)
+            yield seq_name, description, seq
+        if not out.closed:
+            encoded = json.dumps(footer).encode()
+            out.write(encoded)
+            out.write(FOOTER.pack(len(encoded), MAGIC))
+            out.close()
+            complete = source_key(f) == key
+    except OSError:
+        complete = False
+    finally:
+        try:
+            if not out.closed:
+                out.close()
+            if complete:
+                os.replace(tmp_path, entry_path(f))
+                evict(max_cache_bytes())
+            else:
+                # the caller stopped early, the file changed while it was read or the entry could not be written
+                os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def evict(max_bytes):
+    """Removes the least recently used entries until the cache directory holds at most max_bytes"""
+    directory = cache_dir()
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".rec"):
+            stat = os.stat(os.path.join(directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(directory, name))
+        total -= size
+
+
+def iter_records(f):
+    """Same records as read_fasta.iter_records, (identifier, description, sequence), served from the cache when
+    the file was parsed before and has not changed since"""
+    if os.environ.get("FASTA_NO_CACHE"):
+        return read_fasta.iter_records(f)
+    try:
+        size = os.stat(f).st_size
+    except OSError:
+        sys.exit("Error opening file")
+    try:
+        entry = load_entry(f)
+    except (OSError, ValueError, KeyError, struct.error):
+        entry = None  # unreadable or damaged entry, parse again
+    if entry is not None:
+        return iter_cached(*entry)
+    if size > max_cache_bytes():
+        # the entry would be evicted as soon as written
+        return read_fasta.iter_records(f)
+    return iter_and_store(f)
+
+
+def read(f):
+    """Same as read_fasta.read going through the cache"""
+    return {seq_name: seq for seq_name, _, seq in iter_records(f)}
@@ -0,0 +1,202 @@
+import sys
+import os
+import getopt
+import numpy as np
+import record_cache
+
+"""Suffix array index over all the sequences of a FASTA file, to answer repeat questions for any length N
+without scanning the file again.
+The records are concatenated with a separator, the suffix array lists the suffixes in sorted order and the LCP array
+holds the length of the common prefix of every suffix with the previous one (never crossing a separator, so repeats
+stay inside a record). All the copies of a repeat are then neighbours in the suffix array:
+the repeats of length N are the runs of LCP >= N, and the longest repeats are at the maximum of the LCP array.
+Like repeats.py the repeats are on the forward strand, may overlap and are case sensitive.
+The index is saved next to the FASTA file as <filename>.sa.npz and reused while the FASTA file is unchanged."""
+
+
+def usage():
+    print(
+        """Most frequent repeats of length N, or longest repeats, from the suffix array index of a FASTA file.
+
+Usage:
+    repeat_index.py [-n <N>] [-l] <filename>
+
+    -n <N>              most frequent repeats of length N (default = 12)
+    -l                  longest repeats instead
+""")
+
+
+SEPARATOR = b"\n"
+SLICE_PAIRS = 64  # pairs still being compared when common_prefixes switches to slices
+
+
+class RepeatIndex:
+    def __init__(self, text, sa, lcp):
+        self.text = text
+        self.sa = sa
+        self.lcp = lcp
+
+    @classmethod
+    def from_fasta(cls, f):
+        text = SEPARATOR.join(seq.encode() for _, _, seq in record_cache.iter_records(f)) + SEPARATOR
+        sa = suffix_array(text)
+        return cls(text, sa, lcp_array(text, sa))
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            np.savez(file, text=np.frombuffer(self.text, dtype=np.uint8), sa=self.sa, lcp=self.lcp)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["text"].tobytes(), data["sa"], data["lcp"])
+
+    def _runs(self, N):
+        """(first, last) suffix array ranks of every group of at least 2 suffixes sharing a prefix of length N"""
+        shared = np.concatenate(([False], self.lcp[1:] >= N, [False]))
+        edges = np.flatnonzero(shared[1:] != shared[:-1])
+        # a run of True at ranks first+1..last means suffixes first..last share N bases
+        return zip((edges[0::2]).tolist(), edges[1::2].tolist())
+
+    def all_repeats(self, N):
+        """Returns dict of repeats of length N: times"""
+        repeats = {}
+        for first, last in self._runs(N):
+            start = int(self.sa[first])
+            repeats[self.text[start:start + N].decode()] = last - first + 1
+        return repeats
+
+    def most_freq_repeat(self, N):
+        """Returns a tuple with the list of the most frequent repeats of length N and how many times they occur"""
+        repeats = self.all_repeats(N)
+        max_freq = max(repeats.values(), default=0)
+        return [k for k in repeats if repeats[k] == max_freq], max_freq
+
+    def longest_repeats(self):
+        """Returns a tuple with the list of the longest repeats and their length"""
+        longest = int(self.lcp.max(initial=0))
+        if longest == 0:
+            return [], 0
+        found = []
+        for rank in np.flatnonzero(self.lcp == longest).tolist():
+            start = int(self.sa[rank])
+            repeat = self.text[start:start + longest].decode()
+            if repeat not in found:
+                found.append(repeat)
+        return found, longest
+
+
+def suffix_array(text):
+    """Suffix array by prefix doubling: the suffixes are sorted by their first k bases, then by 2k bases
+    using the ranks of the first k and of the next k, until all the ranks are different"""
+    n = len(text)
+    rank = np.frombuffer(text, dtype=np.uint8).astype(np.int64)
+    sa = np.argsort(rank, kind="stable")
+    k = 1
+    while n:
+        next_rank = np.full(n, -1, dtype=np.int64)
+        if k < n:
+            next_rank[:n - k] = rank[k:]
+        sa = np.lexsort((next_rank, rank))
+        keys_rank, keys_next = rank[sa], next_rank[sa]
+        changed = np.concatenate(([1], (keys_rank[1:] != keys_rank[:-1]) | (keys_next[1:] != keys_next[:-1])))
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[sa] = np.cumsum(changed) - 1
+        rank = new_rank
+        if rank[sa[-1]] == n - 1:
+            break
+        k *= 2
+    return sa
+
+
+def common_prefixes(text, starts, others, limits):
+    """Length of the common prefix of the suffixes at starts and at others (no common prefix where others is -1),
+    at most limits. All the pairs are compared 8 bytes at a time in vectorized rounds, the last few ones left
+    (long repeats) are compared with slices of doubling size"""
+    h = np.zeros(len(starts), dtype=np.int64)
+    # the 8 bytes starting at every position of the text, read as one integer, the first byte in the low bits
+    padded = text + bytes(8)
+    words = np.ndarray((len(text) + 1,), dtype="<u8", buffer=padded, strides=(1,))
+    active = np.flatnonzero((others >= 0) & (limits > 0))
+    while len(active) > SLICE_PAIRS:
+        differences = words[starts[active] + h[active]] ^ words[others[active] + h[active]]
+        equal = differences == 0
+        differences = differences[~equal]
+        # the lowest set bit of the difference is in the first byte that differs
+        h[active[~equal]] += (np.log2(differences & (~differences + np.uint64(1))) // 8).astype(np.int64)
+        active = active[equal]
+        h[active] += 8
+        active = active[h[active] < limits[active]]
+    for pair in active.tolist():
+        start, other, limit, length = int(starts[pair]), int(others[pair]), int(limits[pair]), int(h[pair])
+        size = 8
+        while length < limit:
+            size = min(size, limit - length)
+            if text[start + length:start + length + size] == text[other + length:other + length + size]:
+                length += size
+                size *= 2
+            elif size == 1:
+                break
+            else:
+                size //= 2
+        h[pair] = length
+    return np.minimum(h, limits)
+
+
+def lcp_array(text, sa):
+    """lcp[r] is the common prefix of the suffixes at ranks r - 1 and r (lcp[0] = 0), cut at the separator so no
+    prefix runs from one record into the next.
+    It is computed in text order as the permuted LCP: plcp[i] is the common prefix of suffix i and of phi[i], the
+    suffix ranked just before it. When the bases before i and before phi[i] are the same (and not a separator)
+    plcp[i] = plcp[i - 1] - 1, like the h - 1 carried by Kasai's algorithm, so only the other, irreducible,
+    positions are compared, all at once, and the sum of their lengths is O(n log n)"""
+    n = len(sa)
+    lcp = np.zeros(n, dtype=np.int64)
+    if n < 2:
+        return lcp
+    data = np.frombuffer(text, dtype=np.uint8)
+    positions = np.arange(n)
+    phi = np.full(n, -1, dtype=np.int64)
+    phi[sa[1:]] = sa[:-1]
+    separators = np.append(np.flatnonzero(data == SEPARATOR[0]), n)
+    to_separator = separators[np.searchsorted(separators, positions)] - positions
+    reducible = np.zeros(n, dtype=bool)
+    reducible[1:] = ((phi[1:] > 0) & (data[:-1] != SEPARATOR[0])
+                     & (data[:-1] == data[np.maximum(phi[1:], 1) - 1]))
+    heads = np.flatnonzero(~reducible)
+    plcp = np.zeros(n, dtype=np.int64)
+    plcp[heads] = common_prefixes(text, heads, phi[heads], to_separator[heads])
+    # every reducible position is one less than the one before it, down from the last irreducible position
+    head_of = np.maximum.accumulate(np.where(reducible, 0, positions))
+    plcp = plcp[head_of] - (positions - head_of)
+    lcp[1:] = plcp[sa[1:]]
+    return lcp
+
+
+def index_path(f):
+    return f + ".sa.npz"
+
+
+def load_index(f):
+    """Loads the saved index of a FASTA file, building and saving it first if it is missing or out of date"""
+    path = index_path(f)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(f):
+        return RepeatIndex.load(path)
+    index = RepeatIndex.from_fasta(f)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'hn:l')
+    options = dict(optional_args)
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+    index = load_index(required_args[0])
+    if '-l' in options:
+        longest, length = index.longest_repeats()
+        print('Longest repeats are:', longest, " and they are", length, "bases long")
+    else:
+        most_freq_repeats, times = index.most_freq_repeat(int(options.get('-n', 12)))
+        print('Most frequent repeats are:', most_freq_repeats, " and they occur", times, "times")
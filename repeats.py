@@ -1,5 +1,6 @@
-import read_fasta
+import record_cache
 import sys
+import getopt
 import seq_lengths
 
 
@@ -12,32 +13,83 @@ import seq_lengths
    """
 
 
-def all_repeats_in_all_seqs(N, f):
+def count_Nmers(seq, N, candidate_repeats):
+    """Adds the N-mers of seq to the candidate_repeats dict of N-mer: times"""
+    for i in range(len(seq) - N + 1):
+        current_Nmer = seq[i:i + N]
+        # store all N-mers as keys of dict and store the number of occurence in values of dict
+        candidate_repeats[current_Nmer] = candidate_repeats.get(current_Nmer, 0) + 1
+    return candidate_repeats
+
+
+def only_repeats(candidate_repeats):
+    # filter out the ones with value < 2, cause they occur once only so they aren't repeats
+    return {repeat: times for repeat, times in candidate_repeats.items() if times >= 2}
+
+
+def most_frequent(repeats):
+    """Returns a tuple with the list of the repeats occurring the most and how many times they occur"""
+    max_freq = max(repeats.values())
+    return [k for k in repeats if repeats[k] == max_freq], max_freq
+
+
+def count_Nmers_of_shard(shard, N):
+    """Work done by one pool task: dict of N-mer: times of the sequences of the shard"""
+    candidate_repeats = {}
+    for seq in shard:
+        count_Nmers(seq, N, candidate_repeats)
+    return candidate_repeats
+
+
+def all_repeats_in_all_seqs(N, f, workers=1):
     """Identify all repeats of length N in all sequences in the FASTA file
+    With workers > 1 the sequences are cut in shards counted by a pool of processes: kmer_counts counts the
+    uppercase ACGT N-mers as packed codes and the other ones as strings. Same repeats and counts as one process,
+    but the dict is in the order of the codes and not of the first occurrences
     Returns dict of repeats: times"""
-    # read fasta file
-    seqs_dict = read_fasta.read(f)
-    all_seqs = seqs_dict.values()
     # initialize empty dict for storage
     candidate_repeats = {}
-    # go through all the positions
-    for seq in all_seqs:
-        for i in range(len(seq) - N + 1):
-            current_Nmer = seq[i:i + N]
-            # store all N-mers as keys of dict and store the number of occurence in values of dict
-            candidate_repeats[current_Nmer] = candidate_repeats.get(current_Nmer, 0) + 1
-    # filter out the ones with value < 2, cause they occur once only so they aren't repeats
-    filtered = {repeat: times for repeat, times in candidate_repeats.items() if times >= 2}
-    return filtered
+    if workers > 1:
+        import kmer_counts
+        if N <= kmer_counts.MAX_PACKED_K:
+            return kmer_counts.all_repeats_in_all_seqs(N, f, workers)
+        seqs = (seq for _, _, seq in record_cache.iter_records(f))
+        for shard_counts in kmer_counts.map_shards(count_Nmers_of_shard, kmer_counts.shards(seqs, N), N, workers):
+            for current_Nmer, times in shard_counts.items():
+                candidate_repeats[current_Nmer] = candidate_repeats.get(current_Nmer, 0) + times
+        return only_repeats(candidate_repeats)
+    # stream the fasta file one record at a time and go through all the positions
+    for _, _, seq in record_cache.iter_records(f):
+        count_Nmers(seq, N, candidate_repeats)
+    return only_repeats(candidate_repeats)
 
 
-def most_freq_repeat(N, f):
-    repeats = all_repeats_in_all_seqs(N, f)
-    max_freq = max(repeats.values())
-    return [k for k in repeats if repeats[k] == max_freq], max_freq
+def most_freq_repeat(N, f, packed=False, memory_budget=None, workers=1):
+    """Most frequent repeats of length N and how many times they occur.
+    With packed=True the N-mers are counted as 2-bit packed integers by kmer_counts, with the same result,
+    with a memory_budget (bytes) they are packed and counted on disk by kmer_spill within that budget: only the
+    ACGT N-mers are counted then, lowercase as uppercase.
+    With workers > 1 the counting is shared by a pool of processes"""
+    if memory_budget is not None:
+        import kmer_spill
+        return kmer_spill.most_freq_repeat(N, f, memory_budget)
+    if packed:
+        import kmer_counts
+        repeats = kmer_counts.all_repeats_in_all_seqs(N, f, workers)
+    else:
+        repeats = all_repeats_in_all_seqs(N, f, workers)
+    return most_frequent(repeats)
 
 
-N = 12
-# print('Repeats dict', all_repeats_in_all_seqs(N, sys.argv[1]))
-most_freq_repeats, times = most_freq_repeat(N, sys.argv[1])
-print('Most frequent repeats are:', most_freq_repeats, " and they occur", times, "times")
+if __name__ == "__main__":
+    # -p counts the repeats with the packed integer engine of kmer_counts
+    # -m <MB> counts them on disk with kmer_spill within a memory budget of <MB> megabytes
+    # -w <workers> shares the counting between <workers> processes
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'pm:w:')
+    options = dict(optional_args)
+    N = 12
+    memory_budget = int(float(options['-m']) * 1024 ** 2) if '-m' in options else None
+    # print('Repeats dict', all_repeats_in_all_seqs(N, required_args[0]))
+    most_freq_repeats, times = most_freq_repeat(N, required_args[0], packed='-p' in options,
+                                                memory_budget=memory_budget, workers=int(options.get('-w', 1)))
+    print('Most frequent repeats are:', most_freq_repeats, " and they occur", times, "times")
@@ -0,0 +1,73 @@
+import sys
+import getopt
+import fasta_index
+
+"""Reverse complement with translate tables.
+All the IUPAC codes are complemented (R <-> Y, K <-> M, B <-> V, D <-> H, S, W and N stay the same, U gives A),
+lowercase stays lowercase and anything else (gaps, '*') is kept as it is.
+For chromosome scale records the streaming functions read the record backwards in chunks of bounded size,
+from disk through the .fai index or from a memory mapped record, so only one chunk is in memory at a time."""
+
+BASES = "ACGTURYKMSWBDHVN"
+COMPLEMENTS = "TGCAAYRMKSWVHDBN"
+COMPLEMENT = str.maketrans(BASES + BASES.lower(), COMPLEMENTS + COMPLEMENTS.lower())
+COMPLEMENT_BYTES = bytes.maketrans((BASES + BASES.lower()).encode(), (COMPLEMENTS + COMPLEMENTS.lower()).encode())
+CHUNK_SIZE = 4 * 1024 * 1024
+LINE_WHITESPACE = b" \t\r\n\x0b\x0c"  # dropped from mapped records, whose sequence lines carry no inner blanks
+
+
+def reverse_complement(seq):
+    """Return the reverse complement of a str or bytes sequence"""
+    if isinstance(seq, str):
+        return seq.translate(COMPLEMENT)[::-1]
+    return bytes(seq).translate(COMPLEMENT_BYTES)[::-1]
+
+
+def iter_reverse_complement(f, identifier, chunk_size=CHUNK_SIZE, index=None):
+    """Yields the reverse complement of a record as bytes chunks of at most chunk_size bases,
+    reading the record from its end to its start with the .fai index of the file"""
+    if index is None:
+        index = fasta_index.read_index(f)
+    entry = index[identifier]
+    with open(f, "rb") as file:
+        end = entry[0]
+        while end > 0:
+            start = max(end - chunk_size, 0)
+            yield reverse_complement(fasta_index.read_bases(file, entry, start, end))
+            end = start
+
+
+def iter_reverse_complement_mapped(mapped_seq, chunk_size=CHUNK_SIZE):
+    """Yields the reverse complement of a read_fasta.MappedSequence as bytes chunks,
+    walking the mapped record backwards chunk_size bytes at a time. Newlines and blanks are dropped"""
+    raw = mapped_seq.raw()
+    end = len(raw)
+    while end > 0:
+        start = max(end - chunk_size, 0)
+        chunk = raw[start:end].tobytes().translate(None, LINE_WHITESPACE)
+        if chunk:
+            yield reverse_complement(chunk)
+        end = start
+
+
+def write_reverse_complement(f, identifier, out, chunk_size=CHUNK_SIZE, line_width=70):
+    """Writes the reverse complement of a record in FASTA format to the open text file out"""
+    out.write(">%s reverse complement\n" % identifier)
+    pending = b''
+    for chunk in iter_reverse_complement(f, identifier, chunk_size):
+        pending += chunk
+        full = len(pending) - len(pending) % line_width
+        for i in range(0, full, line_width):
+            out.write(pending[i:i + line_width].decode() + "\n")
+        pending = pending[full:]
+    if pending:
+        out.write(pending.decode() + "\n")
+
+
+if __name__ == "__main__":
+    # revcomp.py [-c <chunk size>] <filename> <identifier>
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'c:')
+    options = dict(optional_args)
+    if len(required_args) < 2:
+        sys.exit("Usage: revcomp.py [-c <chunk size>] <filename> <identifier>")
+    write_reverse_complement(required_args[0], required_args[1], sys.stdout, int(options.get('-c', CHUNK_SIZE)))
@@ -1,5 +1,9 @@
 import read_fasta
+import record_cache
 import sys
+import getopt
+import array
+import bisect
 
 
 def compute_lengths(recs):
@@ -9,28 +13,115 @@ def compute_lengths(recs):
     return records_length
 
 
+def stream_lengths(f, mapped=False):
+    """ Same as compute_lengths but reads the records of the fasta file one at a time,
+        so only one sequence is held in memory. With mapped=True the file is memory mapped
+        and the lengths are computed on the mapped lines without copying them.
+        Returns a <id, sequence_length> dict"""
+    records = read_fasta.iter_records_mmap(f) if mapped else record_cache.iter_records(f)
+    return {identifier: len(seq) for (identifier, _, seq) in records}
+
+
+def shortest_in_lengths(lengths_dict):
+    """ Returns a tuple with a list of the ids having the smallest length and that length"""
+    min_value = min(lengths_dict.values())
+    return [k for k in lengths_dict if lengths_dict[k] == min_value], min_value
+
+
+def longest_in_lengths(lengths_dict):
+    """ Returns a tuple with a list of the ids having the biggest length and that length"""
+    max_value = max(lengths_dict.values())
+    return [k for k in lengths_dict if lengths_dict[k] == max_value], max_value
+
+
+HISTOGRAM_EDGES = (0, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def n_statistic(sorted_lengths, total, fraction):
+    """ Nx and Lx of lengths sorted longest first: the length of the contig at which the cumulated length
+        reaches fraction of the total, and how many contigs it took
+        Returns a tuple (Nx, Lx)"""
+    cumulated = 0
+    for count, length in enumerate(sorted_lengths, start=1):
+        cumulated += length
+        if cumulated >= total * fraction:
+            return length, count
+    return 0, 0
+
+
+def sequence_stats(f, histogram_edges=HISTOGRAM_EDGES):
+    """ Assembly statistics in a single pass over the fasta file: only one record is held at a time and
+        what is kept per record is its length, so files much bigger than the memory can be summarized.
+        Returns a dict with the number of records, the ids and length of the shortest and longest records,
+        the total bases, N50/N90/L50, the GC fraction (of the A/C/G/T bases), the N fraction and a histogram
+        of the lengths as a list of (bin lower edge, records count)"""
+    lengths = array.array('Q')
+    shortest_ids, shortest = [], None
+    longest_ids, longest = [], None
+    gc = acgt = n = 0
+    histogram = [0] * len(histogram_edges)
+    for identifier, _, seq in record_cache.iter_records(f):
+        length = len(seq)
+        lengths.append(length)
+        if shortest is None or length < shortest:
+            shortest_ids, shortest = [identifier], length
+        elif length == shortest:
+            shortest_ids.append(identifier)
+        if longest is None or length > longest:
+            longest_ids, longest = [identifier], length
+        elif length == longest:
+            longest_ids.append(identifier)
+        g_c = seq.count('G') + seq.count('C') + seq.count('g') + seq.count('c')
+        gc += g_c
+        acgt += g_c + seq.count('A') + seq.count('T') + seq.count('a') + seq.count('t')
+        n += seq.count('N') + seq.count('n')
+        histogram[bisect.bisect_right(histogram_edges, length) - 1] += 1
+    total = sum(lengths)
+    sorted_lengths = sorted(lengths, reverse=True)
+    n50, l50 = n_statistic(sorted_lengths, total, 0.5)
+    n90, l90 = n_statistic(sorted_lengths, total, 0.9)
+    return {
+        "records": len(lengths),
+        "shortest_ids": shortest_ids,
+        "shortest": shortest,
+        "longest_ids": longest_ids,
+        "longest": longest,
+        "total_bases": total,
+        "N50": n50,
+        "L50": l50,
+        "N90": n90,
+        "L90": l90,
+        "gc_fraction": gc / acgt if acgt else 0.0,
+        "n_fraction": n / total if total else 0.0,
+        "histogram": list(zip(histogram_edges, histogram)),
+    }
+
+
 def shortest_seq(records):
     """ What are the identifiers of the shortest sequences?
         Returns a tuple with a list of all shortest sequences and the length"""
-    lengths_dict = compute_lengths(records)
-    min_value = min(lengths_dict.values())
-    return [k for k in lengths_dict if lengths_dict[k] == min_value], min_value
+    return shortest_in_lengths(compute_lengths(records))
 
 
 def longest_seq(records):
     """ What are the identifiers of the longest sequences?
         Returns a tuple with a list of all longest sequences and the length"""
-    lengths_dict = compute_lengths(records)
-    max_value = max(lengths_dict.values())
-    return [k for k in lengths_dict if lengths_dict[k] == max_value], max_value
+    return longest_in_lengths(compute_lengths(records))
 
 
 if __name__ == "__main__":
-    f = sys.argv[1]
-    parsed_records = read_fasta.read(f)
-    print(compute_lengths(parsed_records))
+    # -m memory maps the file, -s prints the assembly statistics instead of the lengths
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'ms')
+    options = dict(optional_args)
+    f = required_args[0]
+    if '-s' in options:
+        for name, value in sequence_stats(f).items():
+            print(name + ":", value)
+        sys.exit()
+    lengths = stream_lengths(f, mapped='-m' in options)
+    print(lengths)
     # Longest sequences
-    long_sequences, l_length = longest_seq(parsed_records)
+    long_sequences, l_length = longest_in_lengths(lengths)
     sys.stdout.write(
         "Longest sequences and their length : " +
         " ".join(
@@ -39,7 +130,7 @@ if __name__ == "__main__":
         str(l_length) + '\n')
 
     # Shortest sequences
-    short_sequences, s_length = shortest_seq(parsed_records)
+    short_sequences, s_length = shortest_in_lengths(lengths)
     sys.stdout.write("Shortest sequences and their length: " + " ".join(
         short_sequences) +
         '\n -> ' +
@@ -0,0 +1,202 @@
+import sys
+import array
+import bisect
+import getopt
+import re
+from collections.abc import Mapping
+import numpy as np
+import record_cache
+
+"""Compact container for all the records of a FASTA file.
+read_fasta.read() returns a {id: str} dict, which costs one Python string object per record on top of the bases.
+SequenceStore keeps all the bases in one contiguous bytearray and the start and length of every record in two
+integer arrays, so a record costs 16 bytes plus its id. It is a read-only Mapping of identifier: RecordView, so the
+scripts iterating records.items() or calling len(records[id]) work unchanged. Getting a record copies nothing,
+slicing a RecordView copies only the slice and returns it as a str in both modes, so the N-mers and codons cut out
+of a record compare, hash and work as dict keys like the ones cut out of a str. view(start, stop) gives the bases
+without any copy, as a memoryview of the buffer, and find/index search a record like str.find/str.index.
+str(view) gives the whole sequence as a string when a function needs one.
+With packed=True the bases are stored 2 bits each (4 per byte) and the bases other than A, C, G and T are kept
+aside as exceptions with their position, a quarter of the memory for the bases. Packed stores fold lowercase to
+uppercase."""
+
+PACK = bytes.maketrans(b"ACGTacgt", b"\x00\x01\x02\x03\x00\x01\x02\x03")
+EXCEPTIONS = re.compile(rb"[^\x00-\x03]")
+LETTERS = np.frombuffer(b"ACGT", dtype=np.uint8)
+SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+class RecordView:
+    """One record of a SequenceStore: its bases are store.bases[start:start + length], nothing is copied"""
+    __slots__ = ("store", "start", "length")
+
+    def __init__(self, store, start, length):
+        self.store = store
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            positions = range(*item.indices(self.length))
+            if not positions:
+                return ""
+            # the span covered by the slice, whatever the sign of its step
+            low, high = min(positions[0], positions[-1]), max(positions[0], positions[-1]) + 1
+            if self.store.packed:
+                data = self.store.unpack(self.start + low, self.start + high)
+            else:
+                data = self.store.bases[self.start + low:self.start + high]
+            return data[positions[0] - low::positions.step].decode()
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("record index out of range")
+        if self.store.packed:
+            return self.store.unpack(self.start + item, self.start + item + 1).decode()
+        return chr(self.store.bases[self.start + item])
+
+    def view(self, start=0, stop=None):
+        """Bases start..stop of the record without copying them: a read-only memoryview of the buffer of an
+        unpacked store (no record can be added to the store while it is alive), bytes decoded from a packed one"""
+        start, stop, _ = slice(start, stop).indices(self.length)
+        stop = max(start, stop)
+        if self.store.packed:
+            return self.store.unpack(self.start + start, self.start + stop)
+        return memoryview(self.store.bases)[self.start + start:self.start + stop].toreadonly()
+
+    def find(self, sub, start=0, end=None):
+        """Like str.find: lowest index of sub in the record, between start and end, -1 if it is not there"""
+        start, end, _ = slice(start, end).indices(self.length)
+        if self.store.packed:
+            return str(self).find(sub, start, end)
+        found = self.store.bases.find(sub.encode(), self.start + start, self.start + max(start, end))
+        return found - self.start if found != -1 else -1
+
+    def index(self, sub, start=0, end=None):
+        """Like str.index: find that raises ValueError when sub is not there"""
+        found = self.find(sub, start, end)
+        if found == -1:
+            raise ValueError("substring not found")
+        return found
+
+    def tobytes(self):
+        if self.store.packed:
+            return self.store.unpack(self.start, self.start + self.length)
+        return bytes(self.store.bases[self.start:self.start + self.length])
+
+    def __str__(self):
+        return self.tobytes().decode()
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return str(self) == other
+        if isinstance(other, RecordView):
+            return self.tobytes() == other.tobytes()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return "RecordView(%r)" % (str(self) if self.length <= 60 else str(self)[:57] + "...")
+
+
+class SequenceStore(Mapping):
+    def __init__(self, packed=False):
+        self.packed = packed
+        self.bases = bytearray()
+        self.size = 0  # bases stored, 4 per byte of self.bases when packed
+        self.exception_positions = array.array('Q')
+        self.exception_bases = bytearray()
+        self.starts = array.array('Q')
+        self.lengths = array.array('Q')
+        self.ids = []
+        self.positions = {}
+
+    @classmethod
+    def from_fasta(cls, f, packed=False):
+        store = cls(packed)
+        for identifier, _, seq in record_cache.iter_records(f):
+            store.add(identifier, seq)
+        return store
+
+    def add(self, identifier, seq):
+        """Appends a record, a record with the same identifier as a previous one replaces it like in a dict"""
+        data = seq.encode() if isinstance(seq, str) else bytes(seq)
+        if identifier in self.positions:
+            position = self.positions[identifier]
+            self.starts[position] = self.size
+            self.lengths[position] = len(data)
+        else:
+            self.positions[identifier] = len(self.ids)
+            self.ids.append(identifier)
+            self.starts.append(self.size)
+            self.lengths.append(len(data))
+        if self.packed:
+            self.pack(data)
+        else:
+            self.bases += data
+        self.size += len(data)
+
+    def pack(self, data):
+        codes = data.translate(PACK)
+        for m in EXCEPTIONS.finditer(codes):
+            self.exception_positions.append(self.size + m.start())
+            self.exception_bases.append(codes[m.start()])
+        codes = np.frombuffer(codes, dtype=np.uint8) & 3
+        # complete the last byte of the buffer first, then 4 codes per byte
+        fill = min(-self.size % 4, len(codes))
+        if fill:
+            last = self.bases[-1]
+            for i, code in enumerate(codes[:fill].tolist()):
+                last |= code << (6 - 2 * ((self.size + i) % 4))
+            self.bases[-1] = last
+            codes = codes[fill:]
+        codes = np.concatenate((codes, np.zeros(-len(codes) % 4, dtype=np.uint8))).reshape(-1, 4)
+        self.bases += np.bitwise_or.reduce(codes << SHIFTS, axis=1).astype(np.uint8).tobytes()
+
+    def unpack(self, start, end):
+        """Bases start..end of a packed store, as bytes"""
+        first, last = start // 4, -(-end // 4)
+        packed = np.frombuffer(self.bases, dtype=np.uint8)[first:last]
+        data = LETTERS[(packed[:, None] >> SHIFTS) & 3].tobytes()[start - 4 * first:end - 4 * first]
+        i = bisect.bisect_left(self.exception_positions, start)
+        if i < len(self.exception_positions) and self.exception_positions[i] < end:
+            data = bytearray(data)
+            while i < len(self.exception_positions) and self.exception_positions[i] < end:
+                data[self.exception_positions[i] - start] = self.exception_bases[i]
+                i += 1
+            data = bytes(data)
+        return data
+
+    def __getitem__(self, identifier):
+        position = self.positions[identifier]
+        return RecordView(self, self.starts[position], self.lengths[position])
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """Bytes used by the bases and the arrays, without the ids"""
+        arrays = (self.starts, self.lengths, self.exception_positions)
+        return len(self.bases) + len(self.exception_bases) + sum(a.itemsize * len(a) for a in arrays)
+
+
+def read(f, packed=False):
+    """Same as read_fasta.read but returns a SequenceStore"""
+    return SequenceStore.from_fasta(f, packed)
+
+
+if __name__ == "__main__":
+    # sequence_store.py [-p] <filename>, -p packs the bases in 2 bits
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'p')
+    if len(required_args) < 1:
+        sys.exit("No input FASTA file provided")
+    store = read(required_args[0], packed=('-p', '') in optional_args)
+    print(len(store), "records,", store.size, "bases,", store.nbytes(), "bytes in the store")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of this repository are flat scripts at its root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,21 @@
+import os
+import benchmark
+
+"""The benchmarks turn the record cache off while they run, and only then."""
+
+
+def test_run_restores_the_environment(monkeypatch):
+    monkeypatch.delenv("FASTA_NO_CACHE", raising=False)
+    seen = set()
+    monkeypatch.setitem(benchmark.BENCHMARKS, "cache", lambda f: seen.add(os.environ.get("FASTA_NO_CACHE")))
+    results = benchmark.run("tiny", repeat=1, names=["cache"])
+    assert list(results["results"]) == ["cache"]
+    assert seen == {"1"}
+    assert "FASTA_NO_CACHE" not in os.environ
+
+
+def test_run_keeps_a_user_setting(monkeypatch):
+    monkeypatch.setenv("FASTA_NO_CACHE", "yes")
+    benchmark.run("tiny", repeat=1, names=["read_fasta.read"])
+    assert os.environ["FASTA_NO_CACHE"] == "yes"
+
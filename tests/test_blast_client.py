@@ -0,0 +1,201 @@
+import os
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+"""BlastClient against a local stand-in of the qblast Put/Get protocol serving canned XML reports,
+so batching, polling, parsing and the cache are tested without the network."""
+
+pytest.importorskip("Bio.Blast")
+import blast_client  # noqa: E402
+
+HIT = """<Hit>
+  <Hit_num>1</Hit_num>
+  <Hit_id>gi|1|ref|NC_1|</Hit_id>
+  <Hit_def>subject %(n)d</Hit_def>
+  <Hit_accession>NC_1</Hit_accession>
+  <Hit_len>%(length)d</Hit_len>
+  <Hit_hsps>
+    <Hsp>
+      <Hsp_num>1</Hsp_num>
+      <Hsp_bit-score>40.1</Hsp_bit-score>
+      <Hsp_score>20</Hsp_score>
+      <Hsp_evalue>%(expect)s</Hsp_evalue>
+      <Hsp_query-from>1</Hsp_query-from>
+      <Hsp_query-to>%(length)d</Hsp_query-to>
+      <Hsp_hit-from>1</Hsp_hit-from>
+      <Hsp_hit-to>%(length)d</Hsp_hit-to>
+      <Hsp_query-frame>1</Hsp_query-frame>
+      <Hsp_hit-frame>1</Hsp_hit-frame>
+      <Hsp_identity>%(length)d</Hsp_identity>
+      <Hsp_positive>%(length)d</Hsp_positive>
+      <Hsp_gaps>0</Hsp_gaps>
+      <Hsp_align-len>%(length)d</Hsp_align-len>
+      <Hsp_qseq>%(seq)s</Hsp_qseq>
+      <Hsp_hseq>%(seq)s</Hsp_hseq>
+      <Hsp_midline>%(midline)s</Hsp_midline>
+    </Hsp>
+  </Hit_hsps>
+</Hit>"""
+
+ITERATION = """<Iteration>
+  <Iteration_iter-num>%(n)d</Iteration_iter-num>
+  <Iteration_query-ID>Query_%(n)d</Iteration_query-ID>
+  <Iteration_query-def>%(identifier)s</Iteration_query-def>
+  <Iteration_query-len>%(length)d</Iteration_query-len>
+  <Iteration_hits>
+%(hit)s
+  </Iteration_hits>
+  <Iteration_stat>
+    <Statistics>
+      <Statistics_db-num>1</Statistics_db-num>
+      <Statistics_db-len>1000</Statistics_db-len>
+      <Statistics_hsp-len>0</Statistics_hsp-len>
+      <Statistics_eff-space>0</Statistics_eff-space>
+      <Statistics_kappa>0.46</Statistics_kappa>
+      <Statistics_lambda>1.28</Statistics_lambda>
+      <Statistics_entropy>0.85</Statistics_entropy>
+    </Statistics>
+  </Iteration_stat>
+</Iteration>"""
+
+REPORT = """<?xml version="1.0"?>
+<!DOCTYPE BlastOutput PUBLIC "-//NCBI//NCBI BlastOutput/EN" "http://www.ncbi.nlm.nih.gov/dtd/NCBI_BlastOutput.dtd">
+<BlastOutput>
+  <BlastOutput_program>blastn</BlastOutput_program>
+  <BlastOutput_version>BLASTN 2.15.0+</BlastOutput_version>
+  <BlastOutput_reference>Stand-in</BlastOutput_reference>
+  <BlastOutput_db>nt</BlastOutput_db>
+  <BlastOutput_query-ID>Query_1</BlastOutput_query-ID>
+  <BlastOutput_query-def>q</BlastOutput_query-def>
+  <BlastOutput_query-len>1</BlastOutput_query-len>
+  <BlastOutput_param>
+    <Parameters>
+      <Parameters_expect>10</Parameters_expect>
+      <Parameters_sc-match>1</Parameters_sc-match>
+      <Parameters_sc-mismatch>-2</Parameters_sc-mismatch>
+      <Parameters_gap-open>0</Parameters_gap-open>
+      <Parameters_gap-extend>0</Parameters_gap-extend>
+      <Parameters_filter>L;m;</Parameters_filter>
+    </Parameters>
+  </BlastOutput_param>
+  <BlastOutput_iterations>
+%s
+  </BlastOutput_iterations>
+</BlastOutput>
+"""
+
+def report(queries):
+    iterations = []
+    for n, (identifier, seq) in enumerate(queries, 1):
+        fields = dict(n=n, identifier=identifier, length=len(seq), seq=seq, midline="|" * len(seq),
+                      expect="1e-%d" % (len(seq)))
+        fields["hit"] = HIT % fields
+        iterations.append(ITERATION % fields)
+    return REPORT % "\n".join(iterations)
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Put returns a new request id, the first Get of a request says it is waiting, the next ones return the XML"""
+    def do_POST(self):
+        server = self.server
+        form = {key: values[0] for key, values in
+                parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode()).items()}
+        with server.lock:
+            if form["CMD"] == "Put":
+                lines = form["QUERY"].split()
+                queries = [(lines[i][1:], lines[i + 1]) for i in range(0, len(lines), 2)]
+                rid = "RID%d" % len(server.submissions)
+                server.submissions[rid] = queries
+                server.polls[rid] = 0
+                page = "<html>\n    RID = %s\n    RTOE = 1\n</html>\n" % rid
+            else:
+                server.polls[form["RID"]] += 1
+                if server.polls[form["RID"]] == 1:
+                    page = "<html>\n    Status=WAITING\n</html>\n"
+                else:
+                    page = report(server.submissions[form["RID"]])
+        body = page.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.submissions = {}
+    server.polls = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("BLAST_CACHE_DIR", str(tmp_path / "cache"))
+    return blast_client.BlastClient(url_base="http://127.0.0.1:%d/Blast.cgi" % server.server_address[1],
+                                    workers=2, batch_size=2, min_interval=0, poll_interval=0)
+
+
+QUERIES = [("q1", "ACGTACGTAC"), ("q2", "GGGCCCAT"), ("q3", "TTTAAACCCGGG"), ("q4", "ACGTT"), ("q5", "CATCAT")]
+
+
+def test_search_batches_and_parses(server, client):
+    found = client.search(QUERIES)
+    assert list(found) == [identifier for identifier, _ in QUERIES]
+    for identifier, seq in QUERIES:
+        blast_record = found[identifier]
+        assert blast_record.query == identifier
+        hsp = blast_record.alignments[0].hsps[0]
+        assert (hsp.query, hsp.sbjct, hsp.expect) == (seq, seq, float("1e-%d" % len(seq)))
+    assert sorted(len(queries) for queries in server.submissions.values()) == [1, 2, 2]
+    assert all(polls == 2 for polls in server.polls.values())
+
+
+def test_cached_queries_are_not_sent_again(server, client):
+    client.search(QUERIES[:3])
+    found = client.search(QUERIES)
+    assert len(server.submissions) == 3
+    assert sorted(sum(server.submissions.values(), [])) == QUERIES
+    assert [found[identifier].query for identifier, _ in QUERIES] == [identifier for identifier, _ in QUERIES]
+
+
+@pytest.mark.parametrize("content", [b"", b"not a pickle", b"cbuiltins\nno_such_class\n.",
+                                     b"cno_such_module\nRecord\n."])
+def test_unloadable_cache_entry_is_a_miss(server, client, content):
+    seq = QUERIES[0][1]
+    client.store(seq, "placeholder")
+    with open(client.cache_path(seq), "wb") as out:
+        out.write(content)
+    assert client.cached(seq) is None
+    assert client.search(QUERIES[:1])["q1"].query == "q1"
+    assert len(server.submissions) == 1
+
+
+def test_unwritable_cache_keeps_the_results(server, client, tmp_path, monkeypatch):
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    monkeypatch.setenv("BLAST_CACHE_DIR", str(not_a_directory))
+    found = client.search(QUERIES)
+    assert [found[identifier].query for identifier, _ in QUERIES] == [identifier for identifier, _ in QUERIES]
+    assert client.cached(QUERIES[0][1]) is None
+
+
+def test_repeated_sequences_are_sent_once(server, client):
+    queries = QUERIES + [("again_" + identifier, seq.lower()) for identifier, seq in QUERIES]
+    found = client.search(queries)
+    assert list(found) == [identifier for identifier, _ in queries]
+    assert sorted(sum(server.submissions.values(), [])) == QUERIES
+    for identifier, seq in QUERIES:
+        assert found["again_" + identifier] is found[identifier]
+    assert sorted(os.listdir(blast_client.cache_dir())) == sorted(
+        os.path.basename(client.cache_path(seq)) for _, seq in QUERIES)
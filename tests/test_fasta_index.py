@@ -0,0 +1,51 @@
+import os
+import errno
+import shutil
+import pytest
+import fasta_index
+import orf
+import read_fasta
+
+"""Looking a record up by identifier must work when the .fai sidecar can't be written next to the FASTA file.
+The tests run as any user, so the failures are simulated rather than made with file permissions."""
+
+FASTA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fasta", "dna2.fasta")
+
+
+@pytest.fixture
+def fasta(tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path / "cache"))
+    f = str(tmp_path / "data" / "dna2.fasta")
+    os.mkdir(os.path.dirname(f))
+    shutil.copy(FASTA, f)
+    return f
+
+
+def read_only(*args, **kwargs):
+    raise PermissionError(errno.EACCES, "Permission denied")
+
+
+def test_lookup_in_a_read_only_directory(fasta, monkeypatch):
+    monkeypatch.setattr(fasta_index.tempfile, "mkstemp", read_only)
+    records = read_fasta.read(fasta)
+    identifier = list(records)[3]
+    assert fasta_index.fetch(fasta, identifier) == records[identifier]
+    assert orf.longest_ORF_for_given_id(fasta, identifier) == orf.longest_orf_in_seq(records[identifier])
+    assert os.listdir(os.path.dirname(fasta)) == ["dna2.fasta"]
+
+
+def test_failed_write_leaves_no_index(fasta, monkeypatch):
+    def full_disk(fd, mode):
+        os.close(fd)
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(fasta_index.os, "fdopen", full_disk)
+    index = fasta_index.build_index(fasta)
+    assert len(index) == len(read_fasta.read(fasta))
+    assert os.listdir(os.path.dirname(fasta)) == ["dna2.fasta"]
+
+
+def test_index_is_written_and_reused(fasta):
+    index = fasta_index.build_index(fasta)
+    assert os.path.exists(fasta_index.index_path(fasta))
+    assert fasta_index.read_index(fasta) == index
@@ -0,0 +1,50 @@
+import random
+import pytest
+import new
+import kmer_counts
+import repeats
+
+"""The sharded and multi-process counts must be the counts of a single pass, whatever the shards."""
+
+
+def random_sequences(alphabet, count=60, seed=5):
+    rng = random.Random(seed)
+    return [new.create_long_dna(rng.randrange(0, 2000), alphabet, rng) for _ in range(count)]
+
+
+@pytest.mark.parametrize("k", [3, 8, 14, 20])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sharded_counts_match_count_kmers(k, workers):
+    seqs = random_sequences("ACGTACGTNacgt")
+    expected = kmer_counts.count_kmers(seqs, k)
+    assert kmer_counts.count_kmers_sharded(seqs, k, workers, shard_bases=3000) == expected
+
+
+def test_sum_tables_merges_as_tables_arrive():
+    seqs = random_sequences("ACGT")
+    tables = [kmer_counts.count_shard(shard, 16) for shard in kmer_counts.shards(seqs, 16, 1000)]
+    codes, times = kmer_counts.sum_tables(iter(tables), 16)
+    expected_codes, expected_times = kmer_counts.merge_tables(tables)
+    assert codes.tolist() == expected_codes.tolist() and times.tolist() == expected_times.tolist()
+
+
+@pytest.mark.parametrize("N", [4, 12, 14, 40])
+def test_repeats_with_workers_match_one_process(N, tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path / "cache"))
+    f = tmp_path / "mixed.fa"
+    f.write_text("".join(">r%d\n%s\n" % (i, seq) for i, seq in enumerate(random_sequences("ACGTACGTNacgt"))))
+    assert repeats.all_repeats_in_all_seqs(N, str(f), workers=2) == repeats.all_repeats_in_all_seqs(N, str(f))
+
+
+@pytest.mark.parametrize("N", [4, 12, 14])
+def test_packed_repeats_are_case_sensitive(N, tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path / "cache"))
+    rng = random.Random(8)
+    seqs = ["acgt" * 9 + "ACGT" * 3 + new.create_long_dna(rng.randrange(0, 500), "ACGTacgtN", rng)
+            for _ in range(20)]
+    f = tmp_path / "masked.fa"
+    f.write_text("".join(">r%d\n%s\n" % (i, seq) for i, seq in enumerate(seqs)))
+    expected = repeats.all_repeats_in_all_seqs(N, str(f))
+    assert kmer_counts.all_repeats_in_all_seqs(N, str(f)) == expected
+    assert kmer_counts.all_repeats_in_all_seqs(N, str(f), workers=2) == expected
+    assert sorted(repeats.most_freq_repeat(N, str(f), packed=True)[0]) == sorted(repeats.most_freq_repeat(N, str(f))[0])
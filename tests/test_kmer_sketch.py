@@ -0,0 +1,51 @@
+import random
+import numpy as np
+import pytest
+import new
+import kmer_counts
+import kmer_sketch
+
+"""The Space-Saving summary must stay within its memory bound however its input is batched."""
+
+
+def test_space_saving_heap_stays_bounded_within_one_add():
+    rng = np.random.default_rng(3)
+    codes = rng.integers(0, 500, 200000)
+    summary = kmer_sketch.SpaceSaving(capacity=20)
+    summary.add(codes, np.ones(len(codes), dtype=np.int64))
+    assert len(summary.counters) == 20
+    assert len(summary.heap) <= 4 * summary.capacity
+    one_by_one = kmer_sketch.SpaceSaving(capacity=20)
+    for code in codes.tolist():
+        one_by_one.add(np.array([code]), np.array([1]))
+    assert summary.counters == one_by_one.counters
+
+
+def test_space_saving_is_exact_below_capacity():
+    codes = np.array([5, 7, 5, 9, 5, 7])
+    summary = kmer_sketch.SpaceSaving(capacity=10)
+    summary.add(codes, np.ones(len(codes), dtype=np.int64))
+    assert summary.counters == {5: [3, 0], 7: [2, 0], 9: [1, 0]}
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        kmer_sketch.SpaceSaving(capacity=0)
+
+
+def test_heavy_hitters_bound_the_true_counts():
+    rng = random.Random(4)
+    motifs = [new.create_long_dna(12, "ACGT", rng) for _ in range(5)]
+    seqs = []
+    for _ in range(400):
+        parts = [new.create_long_dna(rng.randrange(0, 40), "ACGT", rng) for _ in range(3)]
+        seqs.append(parts[0] + rng.choice(motifs) + parts[1] + rng.choice(motifs) + parts[2])
+    exact = kmer_counts.count_kmers(seqs, 12)
+    hitters = kmer_sketch.HeavyHitters(12, width=2 ** 12, capacity=50)
+    for seq in seqs:
+        hitters.add(seq)
+    found = hitters.top()
+    assert {kmer for kmer, _, _ in found[:5]} == set(motifs)
+    for kmer, estimate, lower in found:
+        true_count = exact.get(kmer_counts.kmer_codes(kmer, 12)[0], 0)
+        assert lower <= true_count <= estimate
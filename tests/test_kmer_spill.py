@@ -0,0 +1,55 @@
+import gzip
+import random
+import pytest
+import compressed
+import new
+import kmer_counts
+import kmer_spill
+
+"""Counting on disk must give the counts of kmer_counts, also when the buckets have to be split."""
+
+
+@pytest.fixture
+def fasta(tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path / "cache"))
+    rng = random.Random(9)
+    seqs = [new.create_long_dna(rng.randrange(0, 3000), "ACGTACGTNacgt", rng) for _ in range(40)]
+    # a record dominated by one k-mer, the case of poly-A tails and satellites
+    seqs.append("A" * 50000 + new.create_long_dna(1000, "ACGT", rng) + "A" * 30000)
+    f = tmp_path / "input.fa"
+    f.write_text("".join(">r%d\n%s\n" % (i, seq) for i, seq in enumerate(seqs)))
+    return str(f), seqs
+
+
+@pytest.mark.parametrize("k", [5, 12, 20])
+@pytest.mark.parametrize("memory_budget", [20000, kmer_spill.DEFAULT_MEMORY_BUDGET])
+def test_counts_match_kmer_counts(fasta, tmp_path, k, memory_budget):
+    f, seqs = fasta
+    counted = {}
+    for codes, times in kmer_spill.iter_counts(f, k, memory_budget, str(tmp_path)):
+        for code, n in zip(codes.tolist(), times.tolist()):
+            assert code not in counted
+            counted[code] = n
+    assert counted == kmer_counts.count_kmers(seqs, k)
+    assert not any(path.name.startswith("kmer_spill.") for path in tmp_path.iterdir())
+
+
+def test_most_freq_repeat(fasta):
+    f, seqs = fasta
+    assert kmer_spill.most_freq_repeat(12, f, 20000) == (["AAAAAAAAAAAA"], 50000 - 11 + 30000 - 11)
+
+
+@pytest.mark.parametrize("kind", ["gzip", "bgzf"])
+def test_compressed_input_is_sized_decompressed(fasta, tmp_path, monkeypatch, kind):
+    f, seqs = fasta
+    packed = str(tmp_path / ("input.fa." + kind))
+    if kind == "gzip":
+        with open(f, "rb") as file, gzip.open(packed, "wb") as out:
+            out.write(file.read())
+    else:
+        compressed.write_bgzf(f, packed)
+    assert compressed.decompressed_size(packed) == compressed.decompressed_size(f) == len(open(f, "rb").read())
+    sized = []
+    monkeypatch.setattr(kmer_spill, "bucket_count", lambda input_bytes, budget: sized.append(input_bytes) or 1)
+    assert kmer_spill.all_repeats_in_all_seqs(12, packed, 20000) == kmer_spill.all_repeats_in_all_seqs(12, f, 20000)
+    assert sized[0] == sized[1] == compressed.decompressed_size(f)
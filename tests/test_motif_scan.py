@@ -0,0 +1,54 @@
+import random
+import pytest
+import motif_scan
+import revcomp
+
+"""The scanner must report the hits of a brute force scan of every position against the IUPAC classes."""
+
+
+def matches(site, pattern):
+    return len(site) == len(pattern) and all(base in motif_scan.IUPAC[code] for base, code in zip(site, pattern))
+
+
+def reference_hits(motifs, seq, both_strands):
+    seq = seq.upper()
+    hits = set()
+    for name, pattern in motifs:
+        pattern = pattern.upper()
+        reverse = revcomp.reverse_complement(pattern)
+        for start in range(len(seq) - len(pattern) + 1):
+            site = seq[start:start + len(pattern)]
+            if matches(site, pattern):
+                hits.add((name, "+", start, start + len(pattern)))
+            if both_strands and matches(site, reverse) and revcomp.reverse_complement(site) != site:
+                hits.add((name, "-", start, start + len(pattern)))
+    return hits
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("both_strands", [True, False])
+def test_scan_matches_brute_force(seed, both_strands):
+    rng = random.Random(seed)
+    motifs = [("m%d" % rng.randrange(3), "".join(rng.choice("ACGTRYSWKMBDHVN") for _ in range(rng.randrange(1, 7))))
+              for _ in range(rng.randrange(1, 4))]
+    seq = "".join(rng.choice("ACGTacgtNU") for _ in range(500))
+    hits = list(motif_scan.MotifScanner(motifs, both_strands).scan(seq))
+    assert len(hits) == len(set(hits))
+    assert set(hits) == reference_hits(motifs, seq, both_strands)
+    assert [(end, start - end) for _, _, start, end in hits] == sorted((end, start - end) for _, _, start, end in hits)
+
+
+def test_exact_motif_overlapping_hits():
+    scanner = motif_scan.MotifScanner([("GT", "GT"), ("AA", "AA")])
+    assert list(scanner.scan("aaaGTAC")) == [
+        ("AA", "+", 0, 2), ("AA", "+", 1, 3), ("GT", "+", 3, 5), ("GT", "-", 5, 7)]
+
+
+def test_long_degenerate_motif_is_not_expanded():
+    scanner = motif_scan.MotifScanner([("N40", "N" * 40)], both_strands=False)
+    assert len(list(scanner.scan("A" * 100))) == 61
+
+
+def test_bad_motif():
+    with pytest.raises(ValueError):
+        motif_scan.MotifScanner([("X", "GTX")])
@@ -0,0 +1,35 @@
+import random
+import pytest
+import new
+import orf
+import orf_vectorized
+
+"""The NumPy backend must find exactly what the pure-Python reference implementations find."""
+
+
+def random_sequences(alphabet, count=200, seed=7):
+    rng = random.Random(seed)
+    return [new.create_long_dna(rng.randrange(0, 400), alphabet, rng) for _ in range(count)]
+
+
+ALPHABETS = ["ACGT", "ACGTN", "ACGTacgt", "AATTGC"]
+
+
+@pytest.mark.parametrize("alphabet", ALPHABETS)
+@pytest.mark.parametrize("nested", [False, True])
+def test_orfs_in_strand_matches_reference(alphabet, nested):
+    for seq in random_sequences(alphabet):
+        expected = sorted(orf.orfs_in_strand(seq, nested))
+        assert sorted(orf_vectorized.orfs_in_strand(seq, nested)) == expected
+
+
+@pytest.mark.parametrize("alphabet", ALPHABETS)
+def test_has_STOP_codon_matches_reference(alphabet):
+    for seq in random_sequences(alphabet):
+        for frame in range(4):
+            assert orf_vectorized.has_STOP_codon(seq, frame) == new.has_STOP_codon(seq, frame)
+
+
+def test_find_orfs_backends_agree():
+    for seq in random_sequences("ACGT", count=50):
+        assert sorted(orf.find_orfs(seq, backend="numpy")) == sorted(orf.find_orfs(seq))
@@ -0,0 +1,23 @@
+import os
+import pytest
+import orf
+import pipeline
+import read_fasta
+
+"""A single pass of the pipeline must give what the scripts give when run one by one."""
+
+FASTA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fasta")
+
+
+@pytest.mark.parametrize("name", ["dna2.fasta", "dna.example.fasta"])
+def test_orfs_stage_finds_the_longest_orf(name, tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path))
+    f = os.path.join(FASTA_DIR, name)
+    records = read_fasta.read(f)
+    found = pipeline.run(f, ["orfs"])["orfs"]
+    for identifier, seq in records.items():
+        lengths = [end - start for _, start, end, _ in orf.find_orfs(seq, strands=(1,))]
+        assert found["orfs"][identifier][1] == max(lengths, default=0)
+    longest = max(max(length for length, _ in orf.longest_orfs_in_seq_per_pos(seq).values())
+                  for seq in records.values())
+    assert found["longest"][1][1] == longest
@@ -0,0 +1,48 @@
+import random
+import pytest
+import numpy as np
+import repeat_index
+
+"""The vectorized LCP array must be the common prefixes of the neighbours in the suffix array, cut at the separators."""
+
+
+def reference_lcp(text, sa):
+    lcp = [0]
+    for previous, suffix in zip(sa[:-1].tolist(), sa[1:].tolist()):
+        length = 0
+        while (suffix + length < len(text) and previous + length < len(text)
+               and text[suffix + length] == text[previous + length] and text[suffix + length:suffix + length + 1] != b"\n"):
+            length += 1
+        lcp.append(length)
+    return lcp
+
+
+def random_text(seed):
+    rng = random.Random(seed)
+    records = [bytes(rng.choice(b"ACGTNa") for _ in range(rng.randrange(0, 300))) for _ in range(rng.randrange(1, 5))]
+    # copies of a record and periodic runs give long, overlapping repeats
+    records.append(records[0] * rng.randrange(1, 4))
+    records.append(b"AC" * rng.randrange(0, 200))
+    return b"\n".join(records) + b"\n"
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_lcp_array_matches_reference(seed):
+    text = random_text(seed)
+    sa = repeat_index.suffix_array(text)
+    assert repeat_index.lcp_array(text, sa).tolist() == reference_lcp(text, sa)
+
+
+@pytest.mark.parametrize("text", [b"\n", b"A\n", b"AAAA\nAAAA\n", b"ACGT", b"A" * 500 + b"\n" + b"A" * 500 + b"\n"])
+def test_lcp_array_edge_cases(text):
+    sa = repeat_index.suffix_array(text)
+    assert repeat_index.lcp_array(text, sa).tolist() == reference_lcp(text, sa)
+
+
+def test_common_prefixes_long_repeat():
+    rng = random.Random(3)
+    block = bytes(rng.choice(b"ACGT") for _ in range(5000))
+    text = block + b"\n" + block + b"T\n"
+    starts, others = np.array([0, 0]), np.array([len(block) + 1, -1])
+    limits = np.array([len(block), len(block)])
+    assert repeat_index.common_prefixes(text, starts, others, limits).tolist() == [len(block), 0]
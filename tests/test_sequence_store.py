@@ -0,0 +1,80 @@
+import os
+import pytest
+import orf
+import repeats
+import read_fasta
+import sequence_store
+
+"""A SequenceStore must give the records, their slices and what the scripts compute on them exactly like the
+dict of str of read_fasta.read."""
+
+FASTA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fasta")
+FASTA = os.path.join(FASTA_DIR, "dna.example.fasta")
+
+
+@pytest.fixture
+def records(tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTA_CACHE_DIR", str(tmp_path))
+    return read_fasta.read(FASTA)
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_records_and_slices_match_str(records, packed):
+    store = sequence_store.read(FASTA, packed)
+    assert list(store) == list(records)
+    for identifier, seq in records.items():
+        view = store[identifier]
+        assert len(view) == len(seq) and view == seq and hash(view) == hash(seq)
+        for item in (slice(0, 12), slice(5, None), slice(None, -7), slice(3, 40, 3), slice(-20, None, -1)):
+            assert type(view[item]) is str
+            assert view[item] == seq[item]
+            assert hash(view[item]) == hash(seq[item])
+        assert view[0] == seq[0] and view[-1] == seq[-1]
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_scripts_work_on_record_views(records, packed):
+    store = sequence_store.read(FASTA, packed)
+    for identifier, seq in records.items():
+        view = store[identifier]
+        assert orf.longest_orf_in_seq(view) == orf.longest_orf_in_seq(seq)
+        assert orf.longest_orfs_in_seq_per_pos(view) == orf.longest_orfs_in_seq_per_pos(seq)
+        assert repeats.count_Nmers(view, 6, {}) == repeats.count_Nmers(seq, 6, {})
+
+
+def test_records_with_longest_orfs_keeps_views(records):
+    found = orf.records_with_longest_orfs(FASTA)
+    assert list(found) == list(records)
+    for identifier, info in found.items():
+        assert isinstance(info["seq"], sequence_store.RecordView)
+        assert info["seq"] == records[identifier]
+        assert info["orfs"] == orf.longest_orf_in_seq(records[identifier])
+        if info["orfs"][2]:
+            assert info["seq"].index(info["orfs"][2]) == records[identifier].index(info["orfs"][2])
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_view_find_and_index(records, packed):
+    store = sequence_store.read(FASTA, packed)
+    for identifier, seq in records.items():
+        record = store[identifier]
+        assert bytes(record.view()) == seq.encode()
+        assert bytes(record.view(10, 50)) == seq[10:50].encode()
+        assert bytes(record.view(-30)) == seq[-30:].encode()
+        assert bytes(record.view(50, 10)) == b""
+        for sub, start, end in (("ATG", 0, None), ("TAG", 100, None), ("GATTACA", 0, None), ("A", 5, 20),
+                                ("CG", -50, -3)):
+            assert record.find(sub, start, end) == seq.find(sub, start, end)
+        orf_found = orf.longest_orf_in_seq(seq)[2]
+        if orf_found:
+            assert record.index(orf_found) == seq.index(orf_found)
+        with pytest.raises(ValueError):
+            record.index("X")
+
+
+def test_view_is_zero_copy():
+    store = sequence_store.SequenceStore()
+    store.add("r", "ACGTACGT")
+    view = store["r"].view(2, 6)
+    assert isinstance(view, memoryview) and view.readonly and view.obj is store.bases
+    assert bytes(view) == b"GTAC"
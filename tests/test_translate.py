@@ -0,0 +1,58 @@
+import random
+import itertools
+import pytest
+import new
+import translate
+
+"""Biopython is the reference: every codon, ambiguity codes included, must translate to what Bio.Seq translates it
+to, for every genetic code table of translate. X is left out of the oracle, Biopython reads it as N but raises
+on the codons with an X that could be a stop."""
+
+Seq = pytest.importorskip("Bio.Seq").Seq
+# Biopython warns that the codons of the context dependent stops are read as amino acids
+pytestmark = pytest.mark.filterwarnings("ignore:This table contains")
+
+IUPAC = "ACGTURYSWKMBDHVN"
+
+
+@pytest.mark.parametrize("table", sorted(translate.GENETIC_CODES))
+def test_every_codon_matches_biopython(table):
+    codons = ["".join(codon) for codon in itertools.product(IUPAC, repeat=3)]
+    seq = "".join(codons)
+    assert translate.translate(seq, table) == str(Seq(seq).translate(table=table))
+    assert translate.translate(seq.lower(), table) == str(Seq(seq.lower()).translate(table=table))
+
+
+@pytest.mark.parametrize("table", sorted(translate.GENETIC_CODES))
+@pytest.mark.parametrize("alphabet", ["ACGT", "ACGTN", "ACGTacgtRYN"])
+def test_random_sequences_match_biopython(table, alphabet):
+    rng = random.Random(11)
+    for _ in range(100):
+        seq = new.create_long_dna(rng.randrange(0, 300), alphabet, rng)
+        for frame in range(3):
+            framed = seq[frame:len(seq) - (len(seq) - frame) % 3]
+            assert translate.translate(seq, table, frame) == str(Seq(framed).translate(table=table))
+            if table not in translate.CONTEXT_DEPENDENT_STOPS:
+                assert (translate.translate(seq, table, frame, to_stop=True) ==
+                        str(Seq(framed).translate(table=table, to_stop=True)))
+
+
+def test_fully_determined_ambiguous_codons():
+    assert translate.translate("GCNATG") == "AM"
+    assert translate.translate("GAYCARATHTAR") == "DQI*"
+
+
+def test_x_is_read_as_n():
+    assert translate.translate("GCXTAXATX") == translate.translate("GCNTANATN") == "AXX"
+
+
+def test_context_dependent_stops_translate_as_amino_acids():
+    assert translate.translate("TAATAGTGA", 27) == "QQW"
+    assert translate.translate("TAATAGTGA", 31) == "EEW"
+    with pytest.raises(ValueError):
+        translate.translate("TAATAGTGA", 28, to_stop=True)
+
+
+def test_unknown_table_lists_the_supported_ones():
+    with pytest.raises(ValueError, match="supported tables are 1, 2, 3, 4, 5, 6, 9, 10, 11, 12"):
+        translate.lookup_table(7)
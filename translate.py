@@ -0,0 +1,174 @@
+import sys
+import getopt
+import numpy as np
+import orf
+import record_cache
+import revcomp
+
+
+def usage():
+    print(
+        """Translates the records of a FASTA file to proteins and writes them as protein FASTA.
+Every codon is turned into an integer code (4 bits per base, the IUPAC codes included) once for the whole sequence
+and looked up in a 4096 entry table of the genetic code, so whole files translate without a Python step per codon.
+Stops translate to *. Codons with ambiguity codes translate like Biopython: to the amino acid all the codons they
+stand for agree on (or B, Z, J for D/N, E/Q, I/L), otherwise to X, as do codons with any other character.
+
+Usage:
+    translate.py [-h] [-t <table>] [-m <mode>] [-l <length>] <filename>
+
+    -h                  means print this message
+    -t <table>          NCBI genetic code table number, one of %s (default = 1)
+                        in 27, 28 and 31 the context dependent stops translate as their amino acid
+    -m <mode>           frame1: translate the records from their first base (default)
+                        six: the six reading frames of every record
+                        orfs: every ORF found by orf.find_orfs
+    -l <length>         with -m orfs, only the ORFs of at least <length> bases
+    <filename>          FASTA file name
+""" % ", ".join(str(number) for number in GENETIC_CODES))
+
+
+# NCBI genetic codes, amino acids of the codons in TCAG order: TTT, TTC, TTA, TTG, TCT, ... GGG
+# In tables 27, 28 and 31 some stops are read as amino acids inside a gene (context dependent): like the NCBI
+# amino acid line and Biopython these codons are translated as the amino acid, never as a stop
+CONTEXT_DEPENDENT_STOPS = {27, 28, 31}
+GENETIC_CODES = {
+    1: "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    2: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG",
+    3: "FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    4: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    5: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG",
+    6: "FFLLSSSSYYQQCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    9: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG",
+    10: "FFLLSSSSYY**CCCWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    11: "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    12: "FFLLSSSSYY**CC*WLLLSPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    13: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSGGVVVVAAAADDEEGGGG",
+    14: "FFLLSSSSYYY*CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG",
+    15: "FFLLSSSSYY*QCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    16: "FFLLSSSSYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    21: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNNKSSSSVVVVAAAADDEEGGGG",
+    22: "FFLLSS*SYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    23: "FF*LSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    24: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSSKVVVVAAAADDEEGGGG",
+    25: "FFLLSSSSYY**CCGWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    26: "FFLLSSSSYY**CC*WLLLAPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    27: "FFLLSSSSYYQQCCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    28: "FFLLSSSSYYQQCCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    29: "FFLLSSSSYYYYCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    30: "FFLLSSSSYYEECC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    31: "FFLLSSSSYYEECCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    32: "FFLLSSSSYY*WCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    33: "FFLLSSSSYYY*CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSSKVVVVAAAADDEEGGGG",
+}
+
+# A, C, G, T/U and the IUPAC ambiguity codes, X counted as N like Biopython does; any other character is code 15
+IUPAC_BASES = ["A", "C", "G", "TU", "R", "Y", "S", "W", "K", "M", "B", "D", "H", "V", "NX"]
+IUPAC_EXPANSIONS = ["A", "C", "G", "T", "AG", "CT", "CG", "AT", "GT", "AC", "CGT", "AGT", "ACT", "ACG", "ACGT", ""]
+BASE_CODES = np.full(256, len(IUPAC_BASES), dtype=np.int16)
+for code, bases in enumerate(IUPAC_BASES):
+    for base in bases:
+        BASE_CODES[ord(base)] = code
+        BASE_CODES[ord(base.lower())] = code
+# amino acids standing for two: Asx, Glx, Xle
+AMBIGUOUS_AMINO_ACIDS = {frozenset("DN"): "B", frozenset("EQ"): "Z", frozenset("IL"): "J"}
+
+
+def lookup_table(table=1):
+    """uint8 array of 4096 amino acids indexed by the codon code 256*b1 + 16*b2 + b3 over the 16 base codes.
+    A codon with ambiguity codes gets the amino acid all the codons it stands for agree on, * when they are all
+    stops, B, Z or J when they are D/N, E/Q or I/L, and X otherwise, like Biopython"""
+    try:
+        amino_acids = GENETIC_CODES[table]
+    except KeyError:
+        raise ValueError("Unknown genetic code table %s, the supported tables are %s"
+                         % (table, ", ".join(str(number) for number in GENETIC_CODES)))
+    code = {}
+    for i, b1 in enumerate("TCAG"):
+        for j, b2 in enumerate("TCAG"):
+            for k, b3 in enumerate("TCAG"):
+                code[b1 + b2 + b3] = amino_acids[16 * i + 4 * j + k]
+    lookup = np.full(16 ** 3, ord("X"), dtype=np.uint8)
+    for c1, bases1 in enumerate(IUPAC_EXPANSIONS):
+        for c2, bases2 in enumerate(IUPAC_EXPANSIONS):
+            for c3, bases3 in enumerate(IUPAC_EXPANSIONS):
+                found = frozenset(code[b1 + b2 + b3] for b1 in bases1 for b2 in bases2 for b3 in bases3)
+                if len(found) == 1:
+                    amino_acid = next(iter(found))
+                else:
+                    amino_acid = AMBIGUOUS_AMINO_ACIDS.get(found, "X")
+                lookup[256 * c1 + 16 * c2 + c3] = ord(amino_acid)
+    return lookup
+
+
+LOOKUPS = {}
+
+
+def translate(seq, table=1, frame=0, to_stop=False):
+    """Protein of seq read from position frame, the last incomplete codon is left out.
+    With to_stop=True the translation ends before the first stop codon, which is refused like Biopython does
+    for the tables whose stops depend on the context"""
+    if to_stop and table in CONTEXT_DEPENDENT_STOPS:
+        raise ValueError("to_stop can't be used with table %s, its stops depend on the context" % table)
+    if table not in LOOKUPS:
+        LOOKUPS[table] = lookup_table(table)
+    codes = BASE_CODES[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+    n_codons = (len(codes) - frame) // 3
+    if n_codons <= 0:
+        return ''
+    codons = codes[frame:frame + 3 * n_codons].reshape(n_codons, 3)
+    ids = 256 * codons[:, 0] + 16 * codons[:, 1] + codons[:, 2]
+    protein = LOOKUPS[table][ids].tobytes().decode()
+    if to_stop:
+        protein = protein.split("*", 1)[0]
+    return protein
+
+
+def six_frames(seq, table=1):
+    """Yields (frame, protein) for the frames 1, 2, 3 of seq and -1, -2, -3 of its reverse complement"""
+    for frame in range(3):
+        yield frame + 1, translate(seq, table, frame)
+    reverse = revcomp.reverse_complement(seq)
+    for frame in range(3):
+        yield -(frame + 1), translate(reverse, table, frame)
+
+
+def translate_records(f, table=1, mode="frame1", min_length=0):
+    """Yields (protein name, protein) for every record of the file:
+    the record from its first base, its six frames or its ORFs depending on mode"""
+    for identifier, _, seq in record_cache.iter_records(f):
+        if mode == "six":
+            for frame, protein in six_frames(seq, table):
+                yield "%s frame=%d" % (identifier, frame), protein
+        elif mode == "orfs":
+            for frame, start, end, orf_seq in orf.find_orfs(seq, min_length):
+                yield "%s frame=%d start=%d end=%d" % (identifier, frame, start + 1, end), translate(orf_seq, table)
+        else:
+            yield identifier, translate(seq, table)
+
+
+def write_protein_fasta(proteins, out, line_width=60):
+    """Streams (name, protein) pairs to the open file out in FASTA format"""
+    for name, protein in proteins:
+        out.write(">" + name + "\n")
+        for i in range(0, len(protein), line_width):
+            out.write(protein[i:i + line_width] + "\n")
+
+
+if __name__ == "__main__":
+    optional_args, required_args = getopt.getopt(sys.argv[1:], 'ht:m:l:')
+    options = dict(optional_args)
+
+    if '-h' in options or len(required_args) < 1:
+        usage()
+        sys.exit()
+
+    table = int(options.get('-t', 1))
+    if table not in GENETIC_CODES:
+        sys.exit("Unknown genetic code table %d, the supported tables are %s"
+                 % (table, ", ".join(str(number) for number in GENETIC_CODES)))
+    mode = options.get('-m', 'frame1')
+    if mode not in ("frame1", "six", "orfs"):
+        sys.exit("Unknown mode " + mode)
+
+    write_protein_fasta(translate_records(required_args[0], table, mode, int(options.get('-l', 0))), sys.stdout)